@@ -0,0 +1,60 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+ASYNC_READ_ROUTES = frozenset((
+    'recipes-list', 'recipes-detail', 'recipes-feed', 'recipes-similar',
+    'recipes-pantry',
+    'ingredients-list', 'ingredients-detail',
+    'tags-list', 'tags-detail',
+    'users-subscriptions',
+))
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+def run_read_view(view, request, *args, **kwargs):
+    """Выполняет представление и рендеринг ответа в потоке пула.
+
+    В Django 3.2 нет асинхронного ORM, поэтому запросы к базе идут в
+    отдельном потоке со своим соединением, которое закрывается по
+    правилам CONN_MAX_AGE, как в конце обычного запроса.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """Асинхронная обертка синхронного представления DRF.
+
+    Чтение выполняется в общем пуле потоков и не блокирует цикл событий
+    и другие запросы. Запись, как и для синхронных представлений под
+    ASGI, выполняется в основном потоке.
+    """
+    read = sync_to_async(run_read_view, thread_sensitive=False)
+    write = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(view, request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_read_urls(urlpatterns):
+    """Подменяет представления маршрутов ASYNC_READ_ROUTES асинхронными."""
+    return [
+        URLPattern(pattern.pattern, async_read_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if pattern.name in ASYNC_READ_ROUTES else pattern
+        for pattern in urlpatterns
+    ]
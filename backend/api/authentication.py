@@ -0,0 +1,45 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+AUTH_TOKEN_KEY = 'auth_token:{digest}'
+
+
+def auth_token_key(key):
+    """Ключ кеша по хешу токена, сам токен в кеш не попадает."""
+    return AUTH_TOKEN_KEY.format(digest=sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys):
+    """Удаляет токены из кеша после фиксации транзакции."""
+    cache_keys = [auth_token_key(key) for key in keys]
+    if cache_keys:
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(Token.objects.filter(
+        user_id=user_id
+    ).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешированием токена и пользователя.
+
+    Запись удаляется из кеша при удалении токена (выход), изменении
+    пользователя (смена пароля, деактивация) и в любом случае устаревает
+    через AUTH_TOKEN_CACHE_TIMEOUT. Кеш общий для всех процессов, поэтому
+    отзыв токена в админке или в другом воркере действует сразу.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = auth_token_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return token.user, token
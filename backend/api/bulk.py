@@ -0,0 +1,142 @@
+from django.db import transaction
+
+from recipes.counters import change_counter
+from recipes.feed import backfill_feed, trim_feed
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.shopping_list import change_shopping_list
+from recipes.utils import delete_rows
+from users.models import Follower, User
+
+from .cache import bump_shopping_cart_versions, bump_user_state_versions
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_ADDED = 'already_added'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+
+
+def lock_user(user_id):
+    """Блокирует строку пользователя до конца транзакции.
+
+    Изменения избранного, корзины и подписок одного пользователя, в
+    том числе одиночные, выполняются по очереди, поэтому разница между
+    запрошенными и существующими связями не устаревает до записи.
+    """
+    list(User.objects.select_for_update().filter(
+        pk=user_id
+    ).values_list('pk', flat=True))
+
+
+class BulkRelation:
+    """Добавление и удаление связей пользователя с объектами пакетом.
+
+    Связи создаются одним bulk_create и удаляются одним DELETE, поэтому
+    сигналы моделей не срабатывают: счетчики и состояние пользователя
+    обновляются здесь же, одним запросом на всю пачку. Разница
+    вычисляется под блокировкой пользователя (lock_user).
+    """
+
+    model = None
+    target = None
+    field = None
+    counter = None
+
+    def __init__(self, user):
+        self.user = user
+
+    def get_existing(self, ids):
+        return set(self.model.objects.filter(
+            user=self.user, **{f'{self.field}__in': ids}
+        ).order_by().values_list(self.field, flat=True))
+
+    def get_found(self, ids):
+        return set(self.target.objects.filter(
+            pk__in=ids
+        ).values_list('pk', flat=True))
+
+    def is_allowed(self, pk):
+        return True
+
+    def changed(self, ids, delta):
+        change_counter(self.target, ids, self.counter, delta)
+        bump_user_state_versions((self.user.id,))
+
+    @transaction.atomic
+    def add(self, ids):
+        lock_user(self.user.id)
+        found = self.get_found(ids)
+        existing = self.get_existing(found)
+        results = {}
+        for pk in ids:
+            if pk not in found:
+                results[pk] = NOT_FOUND
+            elif pk in existing:
+                results[pk] = ALREADY_ADDED
+            elif not self.is_allowed(pk):
+                results[pk] = FORBIDDEN
+            else:
+                results[pk] = ADDED
+        created = [pk for pk, result in results.items() if result == ADDED]
+        if created:
+            self.model.objects.bulk_create(
+                (self.model(user=self.user, **{f'{self.field}_id': pk})
+                 for pk in created),
+                ignore_conflicts=True
+            )
+            self.changed(created, 1)
+        return results
+
+    @transaction.atomic
+    def remove(self, ids):
+        lock_user(self.user.id)
+        existing = self.get_existing(ids)
+        if existing:
+            delete_rows(self.model.objects.filter(
+                user=self.user, **{f'{self.field}__in': existing}
+            ))
+            self.changed(list(existing), -1)
+        found = self.get_found(set(ids) - existing)
+        return {
+            pk: REMOVED if pk in existing
+            else NOT_ADDED if pk in found
+            else NOT_FOUND
+            for pk in ids
+        }
+
+
+class BulkFavorite(BulkRelation):
+    model = Favorite
+    target = Recipe
+    field = 'recipe'
+    counter = 'favorites_count'
+
+
+class BulkShoppingCart(BulkRelation):
+    model = ShoppingCart
+    target = Recipe
+    field = 'recipe'
+    counter = 'in_carts_count'
+
+    def changed(self, ids, delta):
+        super().changed(ids, delta)
+        change_shopping_list(self.user.id, ids, delta)
+        bump_shopping_cart_versions((self.user.id,))
+
+
+class BulkSubscription(BulkRelation):
+    model = Follower
+    target = User
+    field = 'author'
+    counter = 'followers_count'
+
+    def is_allowed(self, pk):
+        return pk != self.user.id
+
+    def changed(self, ids, delta):
+        super().changed(ids, delta)
+        if delta > 0:
+            backfill_feed(self.user.id, ids)
+        else:
+            trim_feed(self.user.id, ids)
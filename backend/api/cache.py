@@ -0,0 +1,125 @@
+from hashlib import md5
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+SHOPPING_CART_VERSION_KEY = 'shopping_cart_version:{user_id}'
+SHOPPING_CART_CONTENT_KEY = 'shopping_cart:{user_id}:{version}:{format}'
+USER_STATE_VERSION_KEY = 'user_state_version:{user_id}'
+INGREDIENTS_VERSION_KEY = 'ingredients_version'
+TAGS_VERSION_KEY = 'tags_version'
+RECIPES_VERSION_KEY = 'recipes_version'
+RECIPE_VERSION_KEY = 'recipe_version:{pk}'
+SIMILAR_RECIPES_VERSION_KEY = 'similar_recipes_version'
+PANTRY_VERSION_KEY = 'pantry_version'
+RECIPES_RESPONSE_KEY = 'recipes_response:{hash}'
+
+
+def get_version(key):
+    """Текущая версия данных; создается при первом обращении."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(*keys):
+    """Сбрасывает версии, чтобы связанные кеши стали недействительными.
+
+    Внутри транзакции версии сбрасываются после ее фиксации, иначе
+    параллельный запрос может закешировать старые данные с новой версией.
+    """
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def shopping_cart_version(user_id):
+    return get_version(SHOPPING_CART_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_shopping_cart_versions(user_ids):
+    bump_versions(*(
+        SHOPPING_CART_VERSION_KEY.format(user_id=user_id)
+        for user_id in user_ids
+    ))
+
+
+def user_state_version(user_id):
+    return get_version(USER_STATE_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_user_state_versions(user_ids):
+    bump_versions(*(
+        USER_STATE_VERSION_KEY.format(user_id=user_id)
+        for user_id in user_ids
+    ))
+
+
+def ingredients_version():
+    return get_version(INGREDIENTS_VERSION_KEY)
+
+
+def bump_ingredients_version():
+    bump_versions(INGREDIENTS_VERSION_KEY)
+
+
+def tags_version():
+    return get_version(TAGS_VERSION_KEY)
+
+
+def bump_tags_version():
+    bump_versions(TAGS_VERSION_KEY)
+
+
+def similar_recipes_version():
+    return get_version(SIMILAR_RECIPES_VERSION_KEY)
+
+
+def bump_similar_recipes_version():
+    bump_versions(SIMILAR_RECIPES_VERSION_KEY)
+
+
+def pantry_version():
+    return get_version(PANTRY_VERSION_KEY)
+
+
+def bump_pantry_version():
+    bump_versions(PANTRY_VERSION_KEY)
+
+
+def bump_recipe_versions(recipe_ids):
+    """Сбрасывает кеш списка рецептов и страниц указанных рецептов."""
+    bump_versions(RECIPES_VERSION_KEY, *(
+        RECIPE_VERSION_KEY.format(pk=pk) for pk in recipe_ids
+    ))
+
+
+def recipes_response_key(request, pk=None):
+    """Ключ кеша ответа со списком рецептов или с одним рецептом."""
+    return RECIPES_RESPONSE_KEY.format(
+        hash=recipes_response_hash(request, pk)
+    )
+
+
+def recipes_response_hash(request, pk=None):
+    """Хеш запроса списка рецептов или одного рецепта.
+
+    Параметры запроса нормализуются, в хеш входят версии данных, от
+    которых зависит ответ.
+    """
+    version_key = (
+        RECIPES_VERSION_KEY if pk is None
+        else RECIPE_VERSION_KEY.format(pk=pk)
+    )
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    ))
+    key = ':'.join((
+        request.build_absolute_uri(request.path), query,
+        get_version(version_key), tags_version(), ingredients_version()
+    ))
+    return md5(key.encode()).hexdigest()
@@ -1,6 +1,13 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+
+from .indexes import tag_index
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_index.get_ids()]
 
 
 class RecipeFilter(filters.FilterSet):
@@ -12,14 +19,14 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
-    tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
-                                             to_field_name='slug',
-                                             queryset=Tag.objects.all())
+    tags = filters.MultipleChoiceFilter(choices=tag_choices,
+                                        method='get_tags')
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'is_in_shopping_cart', 'author',
-                  'tags')
+                  'tags', 'search')
 
     def get_is_favorited(self, queryset, name, value):
         """Фильтр для избранных рецептов."""
@@ -39,6 +46,21 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(shopping_cart__user=user)
         return queryset
 
+    def get_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов.
+
+        Подзапрос EXISTS вместо JOIN не размножает строки рецептов.
+        """
+        tag_ids = tag_index.get_ids()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value if slug in tag_ids]
+        )))
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию рецепта."""
+        return queryset.search(value)
+
 
 class IngredientFilter(filters.FilterSet):
     """Фильтры для ингредиентов."""
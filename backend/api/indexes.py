@@ -0,0 +1,293 @@
+import mmap
+import os
+import sys
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from heapq import nlargest
+from threading import Lock
+
+from django.conf import settings
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.pantry import PostingIndex, recipe_sets
+from recipes.similarity import (SimilarityIndex, jaccard,
+                                recipe_ingredient_sets)
+
+from .cache import (ingredients_version, pantry_version,
+                    similar_recipes_version, tags_version)
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия приводятся к нижнему регистру (casefold) и хранятся в
+    отсортированном списке, поиск по префиксу выполняется через bisect.
+    Индекс перестраивается, когда меняется версия ингредиентов в общем
+    кеше, в том числе после импорта командой в другом процессе.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._keys = []
+        self._items = []
+
+    def _build(self):
+        rows = sorted(
+            (name.casefold(), pk, {'id': pk, 'name': name,
+                                   'measurement_unit': measurement_unit})
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).order_by().iterator()
+        )
+        self._keys = [key for key, _, _ in rows]
+        self._items = [item for _, _, item in rows]
+
+    def _refresh(self):
+        version = ingredients_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build()
+                    self._version = version
+
+    def search(self, query, limit=None):
+        """Ингредиенты, название которых начинается с query или содержит его.
+
+        Совпадения по префиксу идут первыми.
+        """
+        self._refresh()
+        keys, items = self._keys, self._items
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = bisect_right(keys, query + chr(sys.maxunicode), start)
+        result = items[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for index, key in enumerate(keys):
+            if query in key and not start <= index < end:
+                result.append(items[index])
+                if len(result) == limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+class TagIndex:
+    """Соответствие слагов тегов их id в памяти процесса.
+
+    Перестраивается, когда меняется версия тегов в общем кеше, в том
+    числе после импорта тегов командой в другом процессе.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._ids = {}
+
+    def get_ids(self):
+        """Словарь {слаг: id} всех тегов."""
+        version = tags_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._ids = dict(Tag.objects.values_list('slug', 'id'))
+                    self._version = version
+        return self._ids
+
+
+tag_index = TagIndex()
+
+
+class SimilarRecipesIndex:
+    """Похожие по ингредиентам рецепты.
+
+    Основной индекс читается из файла SIMILARITY_INDEX_PATH, который
+    строит команда build_similarity_index, и отображается в память.
+    Рецепты, измененные после построения индекса, при смене версии
+    перечитываются из базы и ищутся отдельно. Запросы только читают
+    файл: без него похожие рецепты не находятся, а перестраивает его
+    команда, например по расписанию с --if-stale.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._file = None
+        self._index = None
+        self._state = None
+
+    def _load(self):
+        try:
+            with open(settings.SIMILARITY_INDEX_PATH, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if key != self._file:
+                    self._index = SimilarityIndex(mmap.mmap(
+                        file.fileno(), 0, access=mmap.ACCESS_READ
+                    ))
+                    self._file = key
+        except FileNotFoundError:
+            pass
+
+    def _build(self):
+        self._load()
+        index = self._index
+        if index is None:
+            self._state = None
+            return
+        changed_ids = list(Recipe.objects.filter(
+            updated_at__gt=index.built_at
+        ).order_by().values_list('id', flat=True))
+        changed = dict.fromkeys(changed_ids, frozenset())
+        changed.update(recipe_ingredient_sets(
+            RecipeIngredient.objects.filter(recipe_id__in=changed_ids)
+        ))
+        buckets = {}
+        for recipe_id, ingredient_ids in changed.items():
+            for key in index.hasher.band_keys(ingredient_ids):
+                buckets.setdefault(key, []).append(recipe_id)
+        self._state = index, changed, buckets
+
+    def _refresh(self):
+        version = similar_recipes_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build()
+                    self._version = version
+
+    def similar(self, recipe_id, limit):
+        """До limit пар (коэффициент Жаккара, id рецепта) по убыванию."""
+        self._refresh()
+        state = self._state
+        if state is None:
+            return []
+        index, changed, buckets = state
+        ingredients = changed.get(recipe_id)
+        if ingredients is None:
+            ingredients = index.get_ingredients(recipe_id)
+        if not ingredients:
+            return []
+        candidates = {}
+        for key in index.hasher.band_keys(ingredients):
+            for position in index.get_bucket(key):
+                candidate = index.ids[position]
+                if candidate not in changed and candidate not in candidates:
+                    candidates[candidate] = index.get_ingredients_at(position)
+            for candidate in buckets.get(key, ()):
+                candidates[candidate] = changed[candidate]
+        candidates.pop(recipe_id, None)
+        return nlargest(limit, (
+            (jaccard(ingredients, other), candidate)
+            for candidate, other in candidates.items()
+        ))
+
+
+similar_recipes_index = SimilarRecipesIndex()
+
+
+class PantryIndex:
+    """Поиск рецептов по имеющимся ингредиентам.
+
+    Инвертированный индекс (PostingIndex) читается из файла
+    PANTRY_INDEX_PATH, который строит команда build_pantry_index, и
+    отображается в память. Рецепты, измененные после его построения, при
+    смене версии перечитываются из базы и учитываются отдельно. Запросы
+    индекс не строят: без файла рецепты не находятся.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._file = None
+        self._index = None
+        self._state = None
+
+    def _load(self):
+        try:
+            with open(settings.PANTRY_INDEX_PATH, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if key != self._file:
+                    self._index = PostingIndex.load(mmap.mmap(
+                        file.fileno(), 0, access=mmap.ACCESS_READ
+                    ))
+                    self._file = key
+        except FileNotFoundError:
+            pass
+
+    def _build(self):
+        self._load()
+        index = self._index
+        if index is None:
+            self._state = None
+            return
+        changed_ids = Recipe.objects.filter(
+            updated_at__gt=index.built_at
+        ).order_by().values_list('id', flat=True)
+        ingredients = recipe_sets(RecipeIngredient.objects.filter(
+            recipe__updated_at__gt=index.built_at
+        ).values_list('recipe_id', 'ingredient_id'))
+        tags = recipe_sets(Recipe.tags.through.objects.filter(
+            recipe__updated_at__gt=index.built_at
+        ).values_list('recipe_id', 'tag_id'))
+        self._state = index, {
+            recipe_id: (ingredients.get(recipe_id, set()),
+                        tags.get(recipe_id, set()))
+            for recipe_id in changed_ids
+        }
+
+    def _refresh(self):
+        version = pantry_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build()
+                    self._version = version
+
+    def search(self, ingredient_ids, min_coverage=0, tag_ids=None):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Возвращает пары (доля ингредиентов рецепта из ingredient_ids,
+        id рецепта) не ниже min_coverage: по убыванию доли, затем числа
+        совпавших ингредиентов и id. С tag_ids - только рецепты хотя бы
+        с одним из тегов.
+        """
+        self._refresh()
+        state = self._state
+        if state is None:
+            return []
+        index, changed = state
+        pantry = set(ingredient_ids)
+        hits = Counter()
+        for ingredient_id in pantry:
+            hits.update(index.ingredients.get(ingredient_id, ()))
+        for recipe_id, (ingredients, _) in changed.items():
+            hits.pop(recipe_id, None)
+            matched = len(ingredients & pantry)
+            if matched:
+                hits[recipe_id] = matched
+        results = []
+        for recipe_id, matched in hits.items():
+            if recipe_id in changed:
+                size = len(changed[recipe_id][0])
+            else:
+                size = index.sizes[recipe_id]
+            coverage = matched / size
+            if coverage >= min_coverage:
+                results.append((coverage, matched, recipe_id))
+        if tag_ids is not None:
+            tag_ids = set(tag_ids)
+            results = [
+                result for result in results
+                if (changed[result[2]][1] & tag_ids if result[2] in changed
+                    else index.has_any_tag(result[2], tag_ids))
+            ]
+        results.sort(reverse=True)
+        return [(coverage, recipe_id) for coverage, _, recipe_id in results]
+
+
+pantry_index = PantryIndex()
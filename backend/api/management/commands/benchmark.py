@@ -0,0 +1,238 @@
+import math
+import time
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follower, User
+
+Case = namedtuple('Case', 'name method url data auth setup',
+                  defaults=(None, True, None))
+
+BULK_SIZE = 20
+IMAGE = ('data:image/gif;base64,'
+         'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+def recipe_payload(context):
+    return {
+        'name': 'Тестовый рецепт', 'text': 'Описание', 'cooking_time': 10,
+        'image': IMAGE, 'tags': [context['tag'].id],
+        'ingredients': [{'id': pk, 'amount': 10}
+                        for pk in context['ingredient_ids']],
+    }
+
+
+CASES = (
+    Case('ingredients-list', 'get', '/api/ingredients/'),
+    Case('ingredients-search', 'get', '/api/ingredients/?name={prefix}'),
+    Case('ingredients-detail', 'get', '/api/ingredients/{ingredient.id}/'),
+    Case('tags-list', 'get', '/api/tags/'),
+    Case('tags-detail', 'get', '/api/tags/{tag.id}/'),
+    Case('reference', 'get', '/api/reference/', auth=False),
+    Case('metrics', 'get', '/api/metrics/', auth=False),
+    Case('recipes-list-anonymous', 'get', '/api/recipes/', auth=False),
+    Case('recipes-list', 'get', '/api/recipes/?limit=6'),
+    Case('recipes-list-filtered', 'get',
+         '/api/recipes/?tags={tag.slug}&author={author.id}'),
+    Case('recipes-list-cursor', 'get', '/api/recipes/?cursor='),
+    Case('recipes-list-sparse', 'get',
+         '/api/recipes/?limit=6&fields=id,name,image,cooking_time'),
+    Case('recipes-search', 'get', '/api/recipes/?search={word}'),
+    Case('recipes-feed', 'get', '/api/recipes/feed/'),
+    Case('recipes-detail', 'get', '/api/recipes/{recipe.id}/'),
+    Case('recipes-similar', 'get', '/api/recipes/{recipe.id}/similar/'),
+    Case('recipes-pantry', 'get', '/api/recipes/pantry/?ingredients={pantry}'),
+    Case('recipes-create', 'post', '/api/recipes/', recipe_payload),
+    Case('recipes-update', 'patch', '/api/recipes/{own_recipe.id}/',
+         recipe_payload),
+    Case('recipes-delete', 'delete', '/api/recipes/{own_recipe.id}/'),
+    Case('recipes-favorite-add', 'post', '/api/recipes/{recipe.id}/favorite/',
+         setup=lambda c: Favorite.objects.filter(
+             user=c['user'], recipe=c['recipe']).delete()),
+    Case('recipes-favorite-remove', 'delete',
+         '/api/recipes/{recipe.id}/favorite/',
+         setup=lambda c: Favorite.objects.get_or_create(
+             user=c['user'], recipe=c['recipe'])),
+    Case('recipes-shopping-cart-add', 'post',
+         '/api/recipes/{recipe.id}/shopping_cart/',
+         setup=lambda c: ShoppingCart.objects.filter(
+             user=c['user'], recipe=c['recipe']).delete()),
+    Case('recipes-shopping-cart-remove', 'delete',
+         '/api/recipes/{recipe.id}/shopping_cart/',
+         setup=lambda c: ShoppingCart.objects.get_or_create(
+             user=c['user'], recipe=c['recipe'])),
+    Case('recipes-download-shopping-cart', 'get',
+         '/api/recipes/download_shopping_cart/'),
+    Case('recipes-favorite-bulk-add', 'post', '/api/recipes/favorite/bulk/',
+         lambda c: {'ids': c['recipe_ids']},
+         setup=lambda c: Favorite.objects.filter(
+             user=c['user'], recipe_id__in=c['recipe_ids']).delete()),
+    Case('recipes-favorite-bulk-remove', 'delete',
+         '/api/recipes/favorite/bulk/', lambda c: {'ids': c['recipe_ids']},
+         setup=lambda c: Favorite.objects.bulk_create(
+             (Favorite(user=c['user'], recipe_id=pk)
+              for pk in c['recipe_ids']), ignore_conflicts=True)),
+    Case('recipes-shopping-cart-bulk-add', 'post',
+         '/api/recipes/shopping_cart/bulk/',
+         lambda c: {'ids': c['recipe_ids']},
+         setup=lambda c: ShoppingCart.objects.filter(
+             user=c['user'], recipe_id__in=c['recipe_ids']).delete()),
+    Case('recipes-shopping-cart-bulk-remove', 'delete',
+         '/api/recipes/shopping_cart/bulk/',
+         lambda c: {'ids': c['recipe_ids']},
+         setup=lambda c: ShoppingCart.objects.bulk_create(
+             (ShoppingCart(user=c['user'], recipe_id=pk)
+              for pk in c['recipe_ids']), ignore_conflicts=True)),
+    Case('users-list', 'get', '/api/users/'),
+    Case('users-detail', 'get', '/api/users/{author.id}/'),
+    Case('users-me', 'get', '/api/users/me/'),
+    Case('users-subscriptions', 'get',
+         '/api/users/subscriptions/?recipes_limit=3'),
+    Case('users-subscribe', 'post', '/api/users/{author.id}/subscribe/',
+         setup=lambda c: Follower.objects.filter(
+             user=c['user'], author=c['author']).delete()),
+    Case('users-unsubscribe', 'delete', '/api/users/{author.id}/subscribe/',
+         setup=lambda c: Follower.objects.get_or_create(
+             user=c['user'], author=c['author'])),
+    Case('users-subscribe-bulk-add', 'post', '/api/users/subscribe/bulk/',
+         lambda c: {'ids': c['author_ids']},
+         setup=lambda c: Follower.objects.filter(
+             user=c['user'], author_id__in=c['author_ids']).delete()),
+    Case('users-subscribe-bulk-remove', 'delete',
+         '/api/users/subscribe/bulk/', lambda c: {'ids': c['author_ids']},
+         setup=lambda c: Follower.objects.bulk_create(
+             (Follower(user=c['user'], author_id=pk)
+              for pk in c['author_ids']), ignore_conflicts=True)),
+    Case('users-create', 'post', '/api/users/', lambda c: {
+        'email': 'benchmark@example.com', 'username': 'benchmark',
+        'first_name': 'Имя', 'last_name': 'Фамилия',
+        'password': 'benchmark-password-123',
+    }, auth=False),
+    Case('users-set-password', 'post', '/api/users/set_password/',
+         lambda c: {'current_password': c['password'],
+                    'new_password': 'benchmark-password-456'}),
+    Case('token-login', 'post', '/api/auth/token/login/',
+         lambda c: {'email': c['user'].email, 'password': c['password']},
+         auth=False),
+    Case('token-logout', 'post', '/api/auth/token/logout/'),
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+
+    help = ('Замер времени ответа и числа SQL-запросов для эндпоинтов API. '
+            'Все изменения данных откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--case', action='append', default=[],
+                            help='Запустить только указанные замеры')
+
+    def get_context(self):
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        if recipe is None:
+            raise CommandError(
+                'Нет данных для замеров, запустите generate_fake_data.'
+            )
+        user = User.objects.exclude(pk=recipe.author_id).filter(
+            recipes__isnull=False
+        ).first()
+        if user is None:
+            raise CommandError('Нужны рецепты минимум двух авторов.')
+        password = 'benchmark-password-123'
+        user.set_password(password)
+        user.save()
+        ingredient = Ingredient.objects.first()
+        return {
+            'user': user,
+            'password': password,
+            'author': recipe.author,
+            'recipe': recipe,
+            'own_recipe': user.recipes.first(),
+            'ingredient': ingredient,
+            'ingredient_ids': list(Ingredient.objects.values_list(
+                'id', flat=True
+            )[:5]),
+            'pantry': ','.join(map(str, recipe.recipe_ingredients.values_list(
+                'ingredient_id', flat=True
+            ))),
+            'prefix': ingredient.name[:2],
+            'tag': Tag.objects.first(),
+            'recipe_ids': list(Recipe.objects.exclude(
+                author=user
+            ).values_list('id', flat=True)[:BULK_SIZE]),
+            'author_ids': list(User.objects.exclude(pk=user.pk).filter(
+                recipes__isnull=False
+            ).values_list('id', flat=True).distinct()[:BULK_SIZE]),
+            'word': recipe.name.split()[0],
+        }
+
+    def run_case(self, case, context, iterations):
+        url = case.url.format(**context)
+        data = case.data(context) if case.data else None
+        timings = []
+        queries = []
+        for _ in range(iterations):
+            with transaction.atomic():
+                if case.setup:
+                    case.setup(context)
+                client = APIClient()
+                if case.auth:
+                    token, _ = Token.objects.get_or_create(
+                        user=context['user']
+                    )
+                    client.credentials(
+                        HTTP_AUTHORIZATION=f'Token {token.key}'
+                    )
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, case.method)(
+                        url, data, format='json'
+                    )
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    timings.append(time.perf_counter() - started)
+                queries.append(len(captured))
+                transaction.set_rollback(True)
+        return response.status_code, timings, queries
+
+    def handle(self, *args, **options):
+        cases = [case for case in CASES
+                 if not options['case'] or case.name in options['case']]
+        self.stdout.write(
+            f'{"эндпоинт":<36}{"код":>5}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"запросов":>10}'
+        )
+        setup_test_environment()
+        try:
+            self.run_cases(cases, options['iterations'])
+        finally:
+            teardown_test_environment()
+
+    def run_cases(self, cases, iterations):
+        with transaction.atomic():
+            context = self.get_context()
+            for case in cases:
+                status, timings, queries = self.run_case(
+                    case, context, iterations
+                )
+                self.stdout.write(
+                    f'{case.name:<36}{status:>5}'
+                    f'{percentile(timings, 0.5) * 1000:>10.1f}'
+                    f'{percentile(timings, 0.95) * 1000:>10.1f}'
+                    f'{max(queries):>10}'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,92 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import RecipeDisplaySerializer
+from api.views import RecipeViewSet
+from recipes.models import Recipe
+
+VARIANTS = (
+    ('full', ''),
+    ('sparse', 'fields=id,name,image,cooking_time'),
+    ('collapsed', 'fields=id,name,author,tags,ingredients'),
+    ('expanded', 'fields=id,name,author,tags,ingredients'
+                 '&expand=author,tags,ingredients'),
+)
+
+
+class Command(BaseCommand):
+
+    help = ('Замер загрузки, сериализации и рендеринга страницы рецептов '
+            'для полного ответа и ответов с параметрами fields и expand.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def get_request(self, query):
+        request = APIRequestFactory().get(f'/api/recipes/?{query}')
+        request.user = AnonymousUser()
+        return Request(request)
+
+    def measure(self, query, page_size):
+        request = self.get_request(query)
+        view = RecipeViewSet(request=request, action='list',
+                             format_kwarg=None)
+        timings = {}
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as captured:
+            recipes = list(view.get_queryset()[:page_size])
+        timings['load'] = time.perf_counter() - started
+        started = time.perf_counter()
+        data = RecipeDisplaySerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+        timings['serialize'] = time.perf_counter() - started
+        for name, renderer in (('json', JSONRenderer()),
+                               ('orjson', FastJSONRenderer())):
+            started = time.perf_counter()
+            content = renderer.render(data)
+            timings[name] = time.perf_counter() - started
+        return timings, len(captured), len(recipes), len(content)
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        if not Recipe.objects.exists():
+            raise CommandError(
+                'Нет данных для замеров, запустите generate_fake_data.'
+            )
+        if orjson is None:
+            self.stdout.write('orjson не установлен, FastJSONRenderer '
+                              'использует стандартный json.')
+        self.stdout.write(
+            f'{"вариант":<12}{"рецептов":>9}{"запросов":>10}{"КБ":>8}'
+            f'{"загрузка":>10}{"сериал.":>9}{"json":>8}{"orjson":>8}'
+            f'{"рецептов/с":>12}'
+        )
+        for name, query in VARIANTS:
+            runs = [self.measure(query, page_size)
+                    for _ in range(options['iterations'])]
+            timings = {
+                stage: statistics.median(run[0][stage] for run in runs)
+                for stage in runs[0][0]
+            }
+            _, queries, count, size = runs[-1]
+            total = timings['load'] + timings['serialize'] + timings['orjson']
+            self.stdout.write(
+                f'{name:<12}{count:>9}{queries:>10}{size / 1024:>8.0f}'
+                f'{timings["load"] * 1000:>10.1f}'
+                f'{timings["serialize"] * 1000:>9.1f}'
+                f'{timings["json"] * 1000:>8.1f}'
+                f'{timings["orjson"] * 1000:>8.1f}'
+                f'{count / total:>12.0f}'
+            )
+        self.stdout.write('Время указано в миллисекундах (медиана).')
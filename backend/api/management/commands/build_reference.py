@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.reference import get_reference
+
+
+class Command(BaseCommand):
+
+    help = 'Сборка справочника тегов и ингредиентов'
+
+    def handle(self, *args, **options):
+        version, content = get_reference()
+        sizes = ', '.join(
+            f'{encoding or "identity"}: {len(data)} байт'
+            for encoding, data in content.items()
+        )
+        self.stdout.write(f'Справочник {version} ({sizes})')
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from api.query_plans import CASES, run_case
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+
+    help = ('Проверка планов SQL-запросов API через EXPLAIN на текущих '
+            'данных, те же случаи проверяет api.tests.test_query_plans. '
+            'Все изменения данных откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--case', action='append', default=[],
+                            help='Проверить только указанные случаи')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Выводить планы всех запросов')
+
+    def get_context(self):
+        user = User.objects.filter(
+            follower__isnull=False, favorites__isnull=False,
+            shopping_cart__isnull=False
+        ).first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для проверки, запустите generate_fake_data.'
+            )
+        recipe = Recipe.objects.exclude(author=user).first()
+        return {
+            'user': user,
+            'author': recipe.author,
+            'recipe': recipe,
+            'tag': Tag.objects.first(),
+        }
+
+    def handle(self, *args, **options):
+        self.verbose_plans = options['verbose_plans']
+        cases = [case for case in CASES
+                 if not options['case'] or case.name in options['case']]
+        setup_test_environment()
+        try:
+            failures = self.run_cases(cases)
+        finally:
+            teardown_test_environment()
+        if failures:
+            raise CommandError(
+                f'Запросы без индексов в случаях: {", ".join(failures)}.'
+            )
+
+    def run_cases(self, cases):
+        self.stdout.write(f'{"случай":<32}{"код":>5}{"запросов":>10}'
+                          f'{"нарушений":>11}')
+        failures = []
+        with transaction.atomic():
+            context = self.get_context()
+            for case in cases:
+                status, plans = run_case(case, context)
+                problems = [(sql, line) for sql, _, found in plans
+                            for line in found]
+                self.stdout.write(
+                    f'{case.name:<32}{status or "-":>5}{len(plans):>10}'
+                    f'{len(problems):>11}'
+                )
+                if self.verbose_plans:
+                    for sql, plan, _ in plans:
+                        self.stdout.write(sql)
+                        self.stdout.write('\n'.join(
+                            f'    {line}' for line in plan
+                        ))
+                for sql, line in problems:
+                    self.stdout.write(f'    {line}\n    {sql[:200]}')
+                if problems:
+                    failures.append(case.name)
+            transaction.set_rollback(True)
+        return failures
@@ -0,0 +1,95 @@
+import math
+import time
+from http.client import HTTPConnection, HTTPSConnection
+from itertools import count
+from threading import Lock, Thread
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/ingredients/?name=а',
+    '/api/tags/',
+)
+
+
+def percentile(values, fraction):
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+
+    help = ('Нагрузочный тест запущенного сервера: много параллельных '
+            'соединений, запросы по кругу к указанным адресам. Например, '
+            'сравнение gunicorn foodgram.wsgi и gunicorn foodgram.asgi '
+            '-k uvicorn.workers.UvicornWorker.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', default=[],
+                            help='Адрес для запросов, можно несколько')
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--token', help='Токен для авторизации')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https'):
+            raise CommandError('Адрес сервера должен начинаться с http(s)://')
+        connection_class = (HTTPSConnection if url.scheme == 'https'
+                            else HTTPConnection)
+        paths = [quote(path, safe='/?=&')
+                 for path in options['path'] or DEFAULT_PATHS]
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        total = options['requests']
+        numbers = count()
+        lock = Lock()
+        timings = []
+        errors = []
+
+        def worker():
+            connection = connection_class(url.netloc, timeout=60)
+            while True:
+                with lock:
+                    number = next(numbers)
+                if number >= total:
+                    break
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', paths[number % len(paths)],
+                                       headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except OSError as error:
+                    connection.close()
+                    status = type(error).__name__
+                elapsed = time.perf_counter() - started
+                with lock:
+                    timings.append(elapsed)
+                    if status != 200:
+                        errors.append(status)
+            connection.close()
+
+        threads = [Thread(target=worker, daemon=True)
+                   for _ in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        self.stdout.write(
+            f'Запросов: {len(timings)}, ошибок: {len(errors)}, '
+            f'{len(timings) / elapsed:.0f} запросов/с\n'
+            f'p50 {percentile(timings, 0.5) * 1000:.1f} мс, '
+            f'p95 {percentile(timings, 0.95) * 1000:.1f} мс, '
+            f'p99 {percentile(timings, 0.99) * 1000:.1f} мс'
+        )
+        if errors:
+            self.stdout.write(f'Коды ошибок: {sorted(set(map(str, errors)))}')
@@ -0,0 +1,247 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+COUNTERS = {
+    'foodgram_http_requests_total': 'Количество запросов.',
+    'foodgram_db_query_duration_seconds_total': 'Время SQL-запросов.',
+}
+HISTOGRAMS = {
+    'foodgram_http_request_duration_seconds': (
+        'Время обработки запроса.', DURATION_BUCKETS
+    ),
+    'foodgram_db_queries_per_request': (
+        'Количество SQL-запросов на один запрос.', QUERIES_BUCKETS
+    ),
+    'foodgram_http_response_size_bytes': (
+        'Размер ответа.', SIZE_BUCKETS
+    ),
+}
+
+
+class Registry:
+    """Метрики текущего процесса.
+
+    Если задан METRICS_DIR, процесс периодически сохраняет свои метрики
+    в отдельный файл, а при выводе суммируются файлы всех процессов.
+    Файлы завершившихся процессов при выводе удаляются: их счетчики
+    сбрасываются, как при перезапуске процесса.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed = 0.0
+
+    def inc(self, name, labels, value=1):
+        self.counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = self.histograms[name, labels] = [
+                [0] * (len(buckets) + 1), 0.0
+            ]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+
+    def dump(self):
+        return {
+            'counters': [[name, labels, value]
+                         for (name, labels), value in self.counters.items()],
+            'histograms': [[name, labels, counts, total]
+                           for (name, labels), (counts, total)
+                           in self.histograms.items()],
+        }
+
+    def flush(self, force=False):
+        """Сохраняет метрики процесса в METRICS_DIR не чаще раза в секунду."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (not force and now - self.flushed < 1):
+            return
+        self.flushed = now
+        path = Path(directory) / f'metrics_{os.getpid()}.json'
+        temporary = path.with_suffix('.tmp')
+        with self.lock:
+            data = self.dump()
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Метрики всех процессов в формате Prometheus."""
+        if settings.METRICS_DIR:
+            self.flush(force=True)
+            dumps = []
+            for path in Path(settings.METRICS_DIR).glob('metrics_*'):
+                if not process_exists(int(path.stem.split('_')[1])):
+                    path.unlink(missing_ok=True)
+                elif path.suffix == '.json':
+                    dumps.append(json.loads(path.read_text()))
+        else:
+            with self.lock:
+                dumps = [self.dump()]
+        counters = defaultdict(float)
+        histograms = {}
+        for dump in dumps:
+            for name, labels, value in dump['counters']:
+                counters[name, tuple(map(tuple, labels))] += value
+            for name, labels, counts, total in dump['histograms']:
+                key = name, tuple(map(tuple, labels))
+                merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+        return render(counters, histograms)
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_labels(labels, **extra):
+    labels = (*labels, *extra.items())
+    return '{%s}' % ','.join(
+        '{}="{}"'.format(name, str(value).replace('"', '\\"'))
+        for name, value in labels
+    )
+
+
+def render(counters, histograms):
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [f'{name}{format_labels(labels)} {value}'
+                  for (metric, labels), value in sorted(counters.items())
+                  if metric == name]
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{format_labels(labels, le=bound)} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    """Считает SQL-запросы и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+current_queries = ContextVar('current_queries', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Учитывает SQL-запрос в счетчике текущего HTTP-запроса."""
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    """Подключает count_queries к соединению с базой.
+
+    Обертка ставится первой, чтобы не мешать временным оберткам
+    execute_wrapper(), которые снимаются с конца списка.
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+class MetricsMiddleware:
+    """Собирает метрики по каждому маршруту (действию вьюсета).
+
+    SQL-запросы считаются на соединениях всех потоков: счетчик запроса
+    хранится в контекстной переменной, которую sync_to_async передает в
+    потоки пула асинхронных представлений. Если METRICS_ENABLED
+    выключен, middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(install_query_counter)
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        install_query_counter(connection)
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        duration = time.perf_counter() - started
+        route = (('route', getattr(request, 'metrics_route', 'unmatched')),)
+        with registry.lock:
+            registry.inc('foodgram_http_requests_total', (
+                *route, ('method', request.method),
+                ('status', response.status_code)
+            ))
+            registry.inc('foodgram_db_query_duration_seconds_total', route,
+                         queries.duration)
+            registry.observe('foodgram_http_request_duration_seconds', route,
+                             duration)
+            registry.observe('foodgram_db_queries_per_request', route,
+                             queries.count)
+            if not response.streaming:
+                registry.observe('foodgram_http_response_size_bytes', route,
+                                 len(response.content))
+        registry.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            request.metrics_route = view_func.__name__
+            return
+        action = getattr(view_func, 'actions', {}).get(request.method.lower())
+        request.metrics_route = (
+            f'{view_class.__name__}.{action}' if action
+            else view_class.__name__
+        )
@@ -1,5 +1,19 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomLimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Постраничный вывод рецептов по курсору, без COUNT(*) и OFFSET."""
+
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+
+
+class FeedCursorPagination(CursorPagination):
+    """Постраничный вывод ленты подписок по курсору."""
+
+    ordering = ('-pub_date', '-recipe_id')
+    page_size_query_param = 'limit'
@@ -0,0 +1,162 @@
+import re
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, FeedItem, Recipe, ShoppingCart,
+                            ShoppingListItem)
+from recipes.similarity import BUILD_MARGIN
+from users.models import Follower
+
+from .cache import SHOPPING_CART_CONTENT_KEY, shopping_cart_version
+
+Case = namedtuple('Case', 'name models url query method setup ordered',
+                  defaults=(None, None, 'get', None, None))
+
+# Просмотр всей таблицы в плане запроса: SQLite пишет "SCAN <таблица>",
+# в том числе при обходе индекса без условий, PostgreSQL - "Seq Scan on
+# <таблица>". Обход индекса без условий допустим только в запросах к
+# таблице упорядоченной выборки: страница читается в порядке индекса до
+# LIMIT, а подсчет по неизбирательному фильтру (тегам) читает ее целиком.
+FULL_SCAN = {
+    'sqlite': re.compile(r'^SCAN (\w+)( USING (?:COVERING )?INDEX \w+)?$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+    'postgresql': re.compile(r'(?:^|->)\s*(?:Incremental )?Sort\b'),
+}
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+# Псевдонимы таблиц в подзапросах Django: "recipes_recipe_tags" U0.
+ALIAS = re.compile(r'"(\w+)" ([A-Z]\d+)\b')
+FROM = re.compile(r'\bFROM "(\w+)"')
+CHECKED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def clear_shopping_list(context):
+    user_id = context['user'].id
+    cache.delete(SHOPPING_CART_CONTENT_KEY.format(
+        user_id=user_id, version=shopping_cart_version(user_id),
+        format='txt'
+    ))
+
+
+def changed_recipes(context):
+    """Запрос измененных рецептов для индексов в памяти."""
+    return Recipe.objects.filter(
+        updated_at__gt=timezone.now() - BUILD_MARGIN
+    ).order_by().values_list('id', flat=True)
+
+
+# Контекст случаев: user с подписками, избранным и корзиной, author и
+# recipe другого пользователя, tag.
+CASES = (
+    Case('recipes-list', (Recipe,), '/api/recipes/?limit=6',
+         ordered=Recipe),
+    Case('recipes-author', (Recipe,),
+         '/api/recipes/?author={author.id}&limit=6', ordered=Recipe),
+    Case('recipes-tags', (Recipe, Recipe.tags.through),
+         '/api/recipes/?tags={tag.slug}&limit=6', ordered=Recipe),
+    Case('recipes-favorited', (Recipe, Favorite),
+         '/api/recipes/?is_favorited=1&limit=6'),
+    Case('recipes-in-shopping-cart', (Recipe, ShoppingCart),
+         '/api/recipes/?is_in_shopping_cart=1&limit=6'),
+    Case('recipes-feed', (FeedItem, Recipe), '/api/recipes/feed/',
+         ordered=FeedItem),
+    Case('recipes-favorite-add', (Favorite,),
+         '/api/recipes/{recipe.id}/favorite/', method='post',
+         setup=lambda c: Favorite.objects.filter(
+             user=c['user'], recipe=c['recipe']).delete()),
+    Case('recipes-shopping-cart-add', (ShoppingCart, ShoppingListItem),
+         '/api/recipes/{recipe.id}/shopping_cart/', method='post',
+         setup=lambda c: ShoppingCart.objects.filter(
+             user=c['user'], recipe=c['recipe']).delete()),
+    Case('recipes-download-shopping-cart', (ShoppingListItem,),
+         '/api/recipes/download_shopping_cart/', setup=clear_shopping_list),
+    Case('users-subscriptions', (Follower, Recipe),
+         '/api/users/subscriptions/?recipes_limit=3'),
+    Case('recipes-changed', (Recipe,), query=changed_recipes),
+)
+
+
+def capture(case, context):
+    """SQL-запросы, выполненные при обработке случая, и код ответа."""
+    statements = []
+
+    def wrapper(execute, sql, params, many, execute_context):
+        statements.append((sql, params))
+        return execute(sql, params, many, execute_context)
+
+    with connection.execute_wrapper(wrapper):
+        if case.query:
+            list(case.query(context))
+            return statements, None
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=context['user'])
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = getattr(client, case.method)(
+            case.url.format(**context), format='json'
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return statements, response.status_code
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(EXPLAIN[connection.vendor] + sql, params)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def check_plan(case, sql, plan):
+    """Нарушения в плане запроса: полные просмотры и сортировки.
+
+    Сортировка недопустима только в запросах к таблице case.ordered,
+    небольшие выборки связанных объектов сортируются.
+    """
+    vendor = connection.vendor
+    tables = {model._meta.db_table for model in case.models}
+    aliases = dict((alias, table) for table, alias in ALIAS.findall(sql))
+    main_table = FROM.search(sql)
+    ordered = case.ordered is not None and main_table is not None and (
+        main_table[1] == case.ordered._meta.db_table
+    )
+    problems = []
+    for line in map(str.strip, plan):
+        match = FULL_SCAN[vendor].search(line)
+        if match and aliases.get(match[1], match[1]) in tables and not (
+            ordered and match.lastindex == 2
+        ):
+            problems.append(line)
+        elif ordered and SORT[vendor].search(line):
+            problems.append(line)
+    return problems
+
+
+def run_case(case, context):
+    """Выполняет случай и откатывает его изменения.
+
+    Возвращает код ответа и тройки (запрос, план, нарушения) для
+    проверенных запросов.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        if case.setup:
+            case.setup(context)
+        statements, status = capture(case, context)
+        plans = []
+        for sql, params in statements:
+            if sql.lstrip().upper().startswith(CHECKED_STATEMENTS):
+                plan = explain(sql, params)
+                plans.append((sql, plan, check_plan(case, sql, plan)))
+        transaction.set_rollback(True)
+    return status, plans
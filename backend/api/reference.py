@@ -0,0 +1,58 @@
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from recipes.models import Ingredient, Tag
+from .cache import ingredients_version, tags_version
+from .serializers import IngredientSerializer, TagSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+REFERENCE_VERSION_KEY = 'reference:{tags_version}:{ingredients_version}'
+REFERENCE_CONTENT_KEY = 'reference_content:{version}'
+
+
+def build_reference():
+    """Собирает справочник и его сжатые варианты.
+
+    Возвращает версию (хеш содержимого) и словарь вида
+    {кодировка: байты}, где '' соответствует несжатому документу.
+    """
+    data = json.dumps({
+        'tags': list(Tag.objects.values(*TagSerializer.Meta.fields)),
+        'ingredients': list(Ingredient.objects.values(
+            *IngredientSerializer.Meta.fields
+        )),
+    }, ensure_ascii=False, separators=(',', ':')).encode()
+    content = {'': data, 'gzip': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        content['br'] = brotli.compress(data)
+    return hashlib.sha256(data).hexdigest()[:16], content
+
+
+def get_reference():
+    """Текущая версия справочника и его содержимое.
+
+    Справочник собирается заново только после изменения тегов или
+    ингредиентов.
+    """
+    version_key = REFERENCE_VERSION_KEY.format(
+        tags_version=tags_version(),
+        ingredients_version=ingredients_version()
+    )
+    version = cache.get(version_key)
+    if version is not None:
+        content = cache.get(REFERENCE_CONTENT_KEY.format(version=version))
+        if content is not None:
+            return version, content
+    version, content = build_reference()
+    cache.set_many({
+        version_key: version,
+        REFERENCE_CONTENT_KEY.format(version=version): content,
+    }, None)
+    return version, content
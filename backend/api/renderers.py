@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+
+from rest_framework import renderers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Базовый класс для выгрузки списка покупок.
+
+    render() используется только для ответов с ошибками, сам список
+    отдается по частям через stream(), по умолчанию - строками текста.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data or '').encode(self.charset)
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield '{name} ({measurement_unit}) - {total_amount}\n'.format(
+                **ingredient
+            )
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в виде текста."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('name', 'measurement_unit', 'total_amount')
+
+    def stream(self, ingredients):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        for ingredient in ingredients:
+            writer.writerow([ingredient[field] for field in self.header])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class JSONShoppingListRenderer(renderers.JSONRenderer):
+    """Список покупок в формате JSON."""
+
+    def stream(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps(ingredient, ensure_ascii=False)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSON-ответы через orjson, если он установлен.
+
+    Без orjson и для ответов с отступами (indent в Accept) работает
+    стандартный JSONRenderer. Даты и типы, которых нет в orjson,
+    преобразуются кодировщиком DRF, поэтому ответ совпадает со
+    стандартным.
+    """
+
+    options = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if orjson is not None else None
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {})):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        ).replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace(
+            '\u2029'.encode(), b'\\u2029'
+        )
@@ -1,8 +1,10 @@
 import base64
 import re
+from functools import partial
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.db import transaction
 from djoser.serializers import (
     UserCreateSerializer as DjoserUserCreateSerializer,
     UserSerializer as DjoserUserSerializer
@@ -17,10 +19,74 @@ from recipes.models import (
     ShoppingCart,
     Tag
 )
+from recipes.shopping_list import refresh_shopping_lists
+from recipes.utils import delete_rows
 from users.models import Follower
 
+from .cache import bump_shopping_cart_versions
+from .indexes import tag_index
+from .user_state import get_user_state
+
 User = get_user_model()
 
+BULK_MAX_IDS = 100
+PANTRY_MAX_INGREDIENTS = 100
+
+
+def parse_fields_param(request, name):
+    """Множество имен из параметра запроса через запятую или None."""
+    value = request.query_params.get(name) if request is not None else None
+    if value is None:
+        return None
+    return {field.strip() for field in value.split(',') if field.strip()}
+
+
+def get_sparse_fields(request):
+    """Поля ответа из параметров fields и expand.
+
+    Возвращает пару (fields, expand): множество запрошенных полей или
+    None, если нужны все поля, и множество раскрываемых вложенных полей.
+    """
+    return (parse_fields_param(request, 'fields'),
+            parse_fields_param(request, 'expand') or set())
+
+
+def is_expanded(name, fields, expand):
+    """Нужно ли поле целиком: без fields все поля отдаются полностью."""
+    return fields is None or name in fields and name in expand
+
+
+class SparseFieldsMixin:
+    """Выбор полей ответа параметрами fields и expand.
+
+    Без параметра fields ответ не меняется. С ним остальные поля
+    исключаются до сериализации и не вычисляются, а вложенные объекты из
+    collapsed_fields отдаются как id, если их нет в expand. Параметры
+    действуют только на объекты верхнего уровня ответа.
+    """
+
+    collapsed_fields = {}
+
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (
+            parent.parent is None
+            and isinstance(parent, serializers.ListSerializer)
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_top_level():
+            return fields
+        requested, expand = get_sparse_fields(self.context.get('request'))
+        if requested is None:
+            return fields
+        return {
+            name: (field if name not in self.collapsed_fields
+                   or name in expand else self.collapsed_fields[name]())
+            for name, field in fields.items() if name in requested
+        }
+
 
 class Base64ImageField(serializers.ImageField):
     """Класс для загрузки изображения в формате base64."""
@@ -68,7 +134,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount', 'name', 'measurement_unit')
 
 
-class UserSerializer(DjoserUserSerializer):
+class UserSerializer(SparseFieldsMixin, DjoserUserSerializer):
     """Сериализатор для отображения пользователей."""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -79,10 +145,8 @@ class UserSerializer(DjoserUserSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return obj.following.filter(user=user).exists()
-        return False
+        state = get_user_state(self.context['request'])
+        return state is not None and obj.id in state.following
 
 
 class UserCreateSerializer(DjoserUserCreateSerializer):
@@ -128,68 +192,118 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Теги не должны повторяться.')
         return tags, ingredients_data
 
-    def add_ingredients_tags(self, recipe, tags, ingredients_data):
-        unique_ingredients = set()
-        recipe_ingredients = []
+    def get_ingredient_amounts(self, ingredients_data):
+        """Проверяет ингредиенты одним запросом.
+
+        Возвращает словарь {id ингредиента: количество}.
+        """
+        amounts = {}
         for ingredient_data in ingredients_data:
             ingredient_id = ingredient_data['ingredient']['id']
-            if ingredient_id in unique_ingredients:
+            if ingredient_id in amounts:
                 raise serializers.ValidationError(
                     'Ингредиенты не должны повторяться.'
                 )
-            unique_ingredients.add(ingredient_id)
-            try:
-                ingredient = Ingredient.objects.get(id=ingredient_id)
-            except Ingredient.DoesNotExist as err:
-                raise serializers.ValidationError(
-                    'Ингредиента не существует.'
-                ) from err
-            amount = ingredient_data.get('amount')
-            recipe_ingredients.append(RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient,
-                amount=amount
-            ))
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+            amounts[ingredient_id] = ingredient_data.get('amount')
+        existing = Ingredient.objects.filter(
+            id__in=amounts
+        ).values_list('id', flat=True)
+        if len(existing) != len(amounts):
+            raise serializers.ValidationError('Ингредиента не существует.')
+        return amounts
+
+    def add_ingredients_tags(self, recipe, tags, amounts):
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+        )
         recipe.tags.set(tags)
         return recipe
 
-    def create(self, validated_data):
+    def update_ingredients_tags(self, recipe, tags, amounts):
+        """Изменяет только те ингредиенты рецепта, которые отличаются."""
+        changed = []
+        removed = []
+        for recipe_ingredient in recipe.recipe_ingredients.all():
+            amount = amounts.pop(recipe_ingredient.ingredient_id, None)
+            if amount is None:
+                removed.append(recipe_ingredient)
+            elif amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if removed:
+            # Сигналы удаления пересчитывали бы списки покупок на каждую
+            # строку, здесь они пересчитываются ниже одним вызовом.
+            delete_rows(RecipeIngredient.objects.filter(
+                id__in=[recipe_ingredient.id for recipe_ingredient in removed]
+            ))
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        ingredient_ids = [
+            recipe_ingredient.ingredient_id
+            for recipe_ingredient in removed + changed
+        ] + list(amounts)
+        recipe = self.add_ingredients_tags(recipe, tags, amounts)
+        if ingredient_ids:
+            user_ids = list(
+                recipe.shopping_cart.values_list('user_id', flat=True)
+            )
+            if user_ids:
+                bump_shopping_cart_versions(user_ids)
+                refresh_shopping_lists(user_ids, ingredient_ids)
+        return recipe
 
+    @transaction.atomic
+    def create(self, validated_data):
         tags, ingredients_data = self.validation_on_create_update(
             validated_data
         )
+        amounts = self.get_ingredient_amounts(ingredients_data)
         recipe = Recipe.objects.create(author=self.context.get('request').user,
                                        **validated_data)
 
         return self.add_ingredients_tags(
             recipe=recipe,
             tags=tags,
-            ingredients_data=ingredients_data
+            amounts=amounts
         )
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags, ingredients_data = self.validation_on_create_update(
             validated_data
         )
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        instance = self.add_ingredients_tags(
+        amounts = self.get_ingredient_amounts(ingredients_data)
+        instance = self.update_ingredients_tags(
             instance,
             tags,
-            ingredients_data
+            amounts
         )
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return RecipeDisplaySerializer(
             instance, context={'request': request}
         ).data
 
 
-class RecipeDisplaySerializer(serializers.ModelSerializer):
+class RecipeDisplaySerializer(SparseFieldsMixin,
+                              serializers.ModelSerializer):
     """Сериализатор для отображения рецептов."""
 
+    collapsed_fields = {
+        'author': partial(serializers.PrimaryKeyRelatedField, read_only=True),
+        'tags': partial(serializers.PrimaryKeyRelatedField, many=True,
+                        read_only=True),
+        'ingredients': partial(serializers.SlugRelatedField,
+                               source='recipe_ingredients',
+                               slug_field='ingredient_id', many=True,
+                               read_only=True),
+    }
+
     ingredients = RecipeIngredientSerializer(source='recipe_ingredients',
                                              many=True)
     tags = TagSerializer(many=True)
@@ -205,16 +319,21 @@ class RecipeDisplaySerializer(serializers.ModelSerializer):
                   'cooking_time')
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=user, recipe=obj).exists()
+        state = get_user_state(self.context['request'])
+        return state is not None and obj.id in state.favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
+        state = get_user_state(self.context['request'])
+        return state is not None and obj.id in state.shopping_cart
+
+
+class PantryRecipeSerializer(RecipeDisplaySerializer):
+    """Рецепт с долей ингредиентов, которые есть у пользователя."""
+
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeDisplaySerializer.Meta):
+        fields = RecipeDisplaySerializer.Meta.fields + ('coverage',)
 
 
 class RecipeSmallSerializer(serializers.ModelSerializer):
@@ -284,26 +403,38 @@ class SubscriptionSerializer(UserSerializer):
     """Сериализатор для отображения подписок."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+
+    collapsed_fields = {
+        'recipes': partial(serializers.SerializerMethodField,
+                           method_name='get_recipe_ids'),
+    }
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
 
+    def get_is_subscribed(self, obj):
+        return True
+
+    def get_limited_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return obj.limited_recipes
+        limit = self.context.get('recipes_limit')
+        recipes = obj.recipes.all()
+        if limit is not None:
+            recipes = recipes[:limit]
+        return recipes
+
     def get_recipes(self, obj):
         request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
         return RecipeSmallSerializer(
-            recipes, many=True,
+            self.get_limited_recipes(obj), many=True,
             context={'request': request}
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+    def get_recipe_ids(self, obj):
+        return [recipe.id for recipe in self.get_limited_recipes(obj)]
 
 
 class SubscriptionCreateSerializer(serializers.ModelSerializer):
@@ -335,7 +466,52 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
-        request = self.context.get('request')
         return SubscriptionSerializer(
-            instance.author, context={'request': request}
+            instance.author,
+            context={'request': self.context.get('request'),
+                     'recipes_limit': self.context.get('recipes_limit')}
         ).data
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для пакетного добавления и удаления."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BULK_MAX_IDS
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class PantrySearchSerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.CharField()
+    min_coverage = serializers.FloatField(min_value=0, max_value=1,
+                                          default=0)
+    tags = serializers.ListField(child=serializers.SlugField(),
+                                 required=False)
+
+    def validate_ingredients(self, value):
+        ids = value.split(',')
+        if not all(pk.strip().isdecimal() for pk in ids):
+            raise serializers.ValidationError(
+                'Укажите id ингредиентов через запятую.'
+            )
+        ids = list(dict.fromkeys(int(pk) for pk in ids))
+        if len(ids) > PANTRY_MAX_INGREDIENTS:
+            raise serializers.ValidationError(
+                f'Не больше {PANTRY_MAX_INGREDIENTS} ингредиентов.'
+            )
+        return ids
+
+    def validate_tags(self, value):
+        tag_ids = tag_index.get_ids()
+        unknown = [slug for slug in value if slug not in tag_ids]
+        if unknown:
+            raise serializers.ValidationError(
+                f'Неизвестные теги: {", ".join(unknown)}.'
+            )
+        return [tag_ids[slug] for slug in value]
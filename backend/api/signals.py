@@ -0,0 +1,105 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follower, User
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .cache import (bump_ingredients_version, bump_pantry_version,
+                    bump_recipe_versions, bump_shopping_cart_versions,
+                    bump_similar_recipes_version, bump_tags_version,
+                    bump_user_state_versions)
+
+USER_SERVICE_FIELDS = frozenset(('last_login',))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    """Рецепт добавлен в корзину или удален из нее."""
+    bump_shopping_cart_versions((instance.user_id,))
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    """Название или единица измерения ингредиента изменились."""
+    bump_shopping_cart_versions(
+        ShoppingCart.objects.filter(
+            recipe__recipe_ingredients__ingredient=instance
+        ).values_list('user_id', flat=True).distinct()
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    """Справочник ингредиентов изменился."""
+    bump_ingredients_version()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, **kwargs):
+    """Справочник тегов изменился."""
+    bump_tags_version()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipe_versions((instance.pk,))
+    bump_similar_recipes_version()
+    bump_pantry_version()
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_recipe_versions((instance.recipe_id,))
+    bump_similar_recipes_version()
+    bump_pantry_version()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    bump_pantry_version()
+    if reverse:
+        bump_tags_version()
+    else:
+        bump_recipe_versions((instance.pk,))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    """Данные автора показываются в его рецептах."""
+    if created or (update_fields and USER_SERVICE_FIELDS.issuperset(
+        update_fields
+    )):
+        return
+    bump_recipe_versions(
+        instance.recipes.values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def user_tokens_changed(sender, instance, created, update_fields, **kwargs):
+    """Смена пароля, деактивация и другие изменения пользователя."""
+    if created or (update_fields and USER_SERVICE_FIELDS.issuperset(
+        update_fields
+    )):
+        return
+    invalidate_user_tokens(instance.id)
+
+
+@receiver(post_delete, sender=Token)
+def token_removed(sender, instance, **kwargs):
+    """Выход: djoser удаляет токен пользователя."""
+    invalidate_tokens((instance.key,))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follower)
+def user_state_changed(sender, instance, **kwargs):
+    """Избранное, корзина или подписки пользователя изменились."""
+    bump_user_state_versions((instance.user_id,))
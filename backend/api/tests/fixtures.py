@@ -0,0 +1,54 @@
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='test-password-123', first_name='Имя', last_name='Фамилия'
+    )
+
+
+def create_tags(count=3):
+    return [Tag.objects.create(name=f'Тег {index}', color='#FFFFFF',
+                               slug=f'tag-{index}')
+            for index in range(count)]
+
+
+def create_ingredients(count):
+    return [Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(count)]
+
+
+def create_recipes(authors, tags, ingredients, count,
+                   ingredients_per_recipe=3):
+    """Рецепты авторов по очереди, с тегами и ингредиентами."""
+    recipes = []
+    for index in range(count):
+        recipe = Recipe.objects.create(
+            name=f'Рецепт {index}', text='Описание', cooking_time=10,
+            image='recipes/test.gif', author=authors[index % len(authors)]
+        )
+        recipe.tags.set(tags[:1 + index % len(tags)])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=position + 1)
+            for position, ingredient in enumerate(
+                ingredients[index:index + ingredients_per_recipe]
+            )
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+def client_for(user=None):
+    """Клиент API, авторизованный токеном пользователя."""
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
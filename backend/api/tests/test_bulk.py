@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from recipes.models import Favorite, Recipe, ShoppingCart, ShoppingListItem
+from users.models import Follower, User
+
+from .fixtures import (client_for, create_ingredients, create_recipes,
+                       create_tags, create_user)
+
+
+class BulkRelationTests(APITestCase):
+    """Счетчики и списки покупок после пакетных изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.authors = [create_user(f'author{index}') for index in range(3)]
+        cls.recipes = create_recipes(
+            cls.authors, create_tags(), create_ingredients(10), 6
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = client_for(self.user)
+
+    def bulk(self, method, url, ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(
+                url, {'ids': ids}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['status'] for item in response.json()}
+
+    def assert_counters(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.favorites_count,
+                             recipe.favorites.count())
+            self.assertEqual(recipe.in_carts_count,
+                             recipe.shopping_cart.count())
+        for user in User.objects.all():
+            self.assertEqual(user.followers_count, user.following.count())
+
+    def test_favorites(self):
+        ids = [recipe.id for recipe in self.recipes]
+        self.client.post(f'/api/recipes/{ids[0]}/favorite/')
+        results = self.bulk('post', '/api/recipes/favorite/bulk/', ids[:3])
+        self.assertEqual(results, {ids[0]: 'already_added',
+                                   ids[1]: 'added', ids[2]: 'added'})
+        self.assert_counters()
+        results = self.bulk('delete', '/api/recipes/favorite/bulk/',
+                            ids[1:4])
+        self.assertEqual(results, {ids[1]: 'removed', ids[2]: 'removed',
+                                   ids[3]: 'not_added'})
+        self.assert_counters()
+        self.assertEqual(set(Favorite.objects.values_list(
+            'recipe_id', flat=True
+        )), {ids[0]})
+        response = self.client.get(f'/api/recipes/{ids[1]}/')
+        self.assertFalse(response.json()['is_favorited'])
+
+    def test_shopping_cart(self):
+        ids = [recipe.id for recipe in self.recipes]
+        self.bulk('post', '/api/recipes/shopping_cart/bulk/', ids[:4])
+        self.bulk('delete', '/api/recipes/shopping_cart/bulk/', ids[2:])
+        self.assert_counters()
+        self.assertEqual(set(ShoppingCart.objects.values_list(
+            'recipe_id', flat=True
+        )), set(ids[:2]))
+        totals = {}
+        for recipe in self.recipes[:2]:
+            for row in recipe.recipe_ingredients.all():
+                totals[row.ingredient_id] = (
+                    totals.get(row.ingredient_id, 0) + row.amount
+                )
+        self.assertEqual(dict(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient_id', 'total_amount')), totals)
+
+    def test_subscriptions(self):
+        ids = [author.id for author in self.authors]
+        results = self.bulk('post', '/api/users/subscribe/bulk/',
+                            ids + [self.user.id])
+        self.assertEqual(results[self.user.id], 'forbidden')
+        self.bulk('delete', '/api/users/subscribe/bulk/', ids[:1])
+        self.assert_counters()
+        self.assertEqual(set(Follower.objects.values_list(
+            'author_id', flat=True
+        )), set(ids[1:]))
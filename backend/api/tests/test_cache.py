@@ -0,0 +1,111 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe, Tag
+
+from .fixtures import (client_for, create_ingredients, create_recipes,
+                       create_tags, create_user)
+
+
+def run_in_other_process(code):
+    """Выполняет код в отдельном процессе manage.py shell.
+
+    Тестовая база другому процессу не видна, общий только кеш.
+    """
+    subprocess.run(
+        (sys.executable, 'manage.py', 'shell', '-c', code),
+        cwd=settings.BASE_DIR, check=True, capture_output=True
+    )
+
+
+class SharedCacheTests(APITestCase):
+    """Версии в кеше, сброшенные другим процессом, видны этому."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = create_tags()
+        cls.recipes = create_recipes(
+            [create_user('author')], cls.tags, create_ingredients(5), 3
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tags(self):
+        response = self.client.get('/api/recipes/', {'tags': 'imported'})
+        self.assertEqual(response.status_code, 400)
+        # Как import_data: bulk_create без сигналов и сброс версии.
+        tag = Tag.objects.bulk_create([Tag(
+            name='Импорт', color='#000000', slug='imported'
+        )])[0]
+        self.recipes[0].tags.add(Tag.objects.get(slug=tag.slug))
+        run_in_other_process(
+            'from api.cache import bump_tags_version; bump_tags_version()'
+        )
+        response = self.client.get('/api/recipes/', {'tags': 'imported'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([recipe['id'] for recipe in response.json()[
+            'results'
+        ]], [self.recipes[0].id])
+
+    def test_ingredients(self):
+        names = [item['name'] for item in self.client.get(
+            '/api/reference/'
+        ).json()['ingredients']]
+        self.assertNotIn('импортированный', names)
+        self.assertEqual(self.client.get(
+            '/api/ingredients/', {'name': 'импорт'}
+        ).json(), [])
+        Ingredient.objects.bulk_create([Ingredient(
+            name='импортированный', measurement_unit='г'
+        )])
+        run_in_other_process(
+            'from api.cache import bump_ingredients_version; '
+            'bump_ingredients_version()'
+        )
+        names = [item['name'] for item in self.client.get(
+            '/api/reference/'
+        ).json()['ingredients']]
+        self.assertIn('импортированный', names)
+        self.assertEqual([item['name'] for item in self.client.get(
+            '/api/ingredients/', {'name': 'импорт'}
+        ).json()], ['импортированный'])
+
+    def test_anonymous_recipes(self):
+        recipe = self.recipes[0]
+
+        def names():
+            return {item['id']: item['name'] for item in self.client.get(
+                '/api/recipes/'
+            ).json()['results']}
+
+        self.assertEqual(names()[recipe.id], recipe.name)
+        # Как правка в другом процессе: сигналы сработали там, здесь
+        # ответ остается в кеше до сброса версии.
+        Recipe.objects.filter(pk=recipe.pk).update(name='Изменен')
+        self.assertEqual(names()[recipe.id], recipe.name)
+        run_in_other_process(
+            'from api.cache import bump_recipe_versions; '
+            f'bump_recipe_versions(({recipe.pk},))'
+        )
+        self.assertEqual(names()[recipe.id], 'Изменен')
+
+    def test_token_revoked(self):
+        user = create_user('reader')
+        client = client_for(user)
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        token = Token.objects.get(user=user)
+        # Как выход или удаление токена в админке другого процесса:
+        # сигнал post_delete срабатывает там.
+        Token.objects.filter(pk=token.pk).update(key='revoked')
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        run_in_other_process(
+            'from api.authentication import invalidate_tokens; '
+            f'invalidate_tokens(({token.key!r},))'
+        )
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
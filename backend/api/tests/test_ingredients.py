@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient
+
+
+class IngredientSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name='стейк семги', measurement_unit='г'),
+            Ingredient(name='стейк семги', measurement_unit='шт.'),
+            Ingredient(name='Стейк говяжий', measurement_unit='г'),
+            Ingredient(name='пекарский порошок', measurement_unit='г'),
+            Ingredient(name='пекарский порошок', measurement_unit='ч. л.'),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [(item['name'], item['measurement_unit'])
+                for item in response.json()]
+
+    def test_duplicate_names(self):
+        self.assertEqual(self.search('стейк с'), [
+            ('стейк семги', 'г'), ('стейк семги', 'шт.'),
+        ])
+        self.assertEqual(self.search('ПЕКАРСКИЙ'), [
+            ('пекарский порошок', 'г'), ('пекарский порошок', 'ч. л.'),
+        ])
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(self.search('стейк'), [
+            ('Стейк говяжий', 'г'), ('стейк семги', 'г'),
+            ('стейк семги', 'шт.'),
+        ])
+        self.assertEqual(self.search('порошок'), [
+            ('пекарский порошок', 'г'), ('пекарский порошок', 'ч. л.'),
+        ])
+
+    def test_invalid_limit(self):
+        for limit in ('²', '-1', 'a'):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/ingredients/',
+                                           {'name': 'стейк', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.client.get(
+            '/api/ingredients/', {'name': 'стейк', 'limit': '2'}
+        ).json()), 2)
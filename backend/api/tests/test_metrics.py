@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from api.metrics import MetricsMiddleware, Registry, registry
+
+
+def query_in_pool_thread(count):
+    """Как асинхронное представление: запросы в отдельном потоке пула."""
+    def run():
+        try:
+            with connection.cursor() as cursor:
+                for _ in range(count):
+                    cursor.execute('SELECT 1')
+        finally:
+            connection.close()
+
+    async_to_sync(sync_to_async(run, thread_sensitive=False))()
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsTests(SimpleTestCase):
+
+    databases = {'default'}
+
+    def queries_observed(self, route):
+        histogram = registry.histograms.get(
+            ('foodgram_db_queries_per_request', (('route', route),))
+        )
+        return histogram[1] if histogram else 0
+
+    def test_queries_in_pool_threads(self):
+        def view(request):
+            request.metrics_route = 'pool-thread-test'
+            query_in_pool_thread(3)
+            return HttpResponse()
+
+        before = self.queries_observed('pool-thread-test')
+        MetricsMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(self.queries_observed('pool-thread-test'),
+                         before + 3)
+        # Без текущего запроса счетчик не ведется.
+        query_in_pool_thread(1)
+        self.assertEqual(self.queries_observed('pool-thread-test'),
+                         before + 3)
+
+    def test_dead_process_files_removed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        process = subprocess.Popen((sys.executable, '-c', ''))
+        process.wait()
+        dead = Registry()
+        dead.inc('foodgram_http_requests_total', (('route', 'dead'),))
+        for suffix in ('json', 'tmp'):
+            with open(os.path.join(
+                directory, f'metrics_{process.pid}.{suffix}'
+            ), 'w') as file:
+                json.dump(dead.dump(), file)
+        with override_settings(METRICS_DIR=directory):
+            output = Registry().collect()
+        self.assertNotIn('route="dead"', output)
+        self.assertEqual(os.listdir(directory),
+                         [f'metrics_{os.getpid()}.json'])
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from api.indexes import PantryIndex
+
+from .fixtures import (create_ingredients, create_recipes, create_tags,
+                       create_user)
+
+INDEX_DIR = tempfile.mkdtemp()
+INDEX_PATH = os.path.join(INDEX_DIR, 'pantry.idx')
+
+
+@override_settings(PANTRY_INDEX_PATH=INDEX_PATH)
+class PantrySearchTests(APITestCase):
+    """Поиск рецептов по имеющимся ингредиентам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = create_ingredients(5)
+        cls.tags = create_tags()
+        cls.recipes = create_recipes(
+            [create_user('author')], cls.tags, cls.ingredients, 3
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(INDEX_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        if os.path.exists(INDEX_PATH):
+            os.unlink(INDEX_PATH)
+
+    def build(self, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('build_pantry_index', *args, output=INDEX_PATH,
+                         stdout=StringIO())
+
+    def search(self, ingredients, **params):
+        return self.client.get('/api/recipes/pantry/',
+                               {'ingredients': ingredients, **params})
+
+    def found(self, ingredients, **params):
+        response = self.search(ingredients, **params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_invalid_ingredients(self):
+        for ingredients in ('²', '1,²', '-1', 'a', ''):
+            with self.subTest(ingredients=ingredients):
+                self.assertEqual(self.search(ingredients).status_code, 400)
+
+    def test_search(self):
+        self.build()
+        ids = ','.join(str(ingredient.id)
+                       for ingredient in self.ingredients[1:4])
+        self.assertEqual(self.found(ids), [
+            self.recipes[1].id, self.recipes[2].id, self.recipes[0].id
+        ])
+        self.assertEqual(self.found(ids, tags=self.tags[2].slug),
+                         [self.recipes[2].id])
+
+    def test_changed_recipe(self):
+        self.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].recipe_ingredients.filter(
+                ingredient=self.ingredients[0]
+            ).delete()
+        self.assertEqual(self.found(self.ingredients[0].id), [])
+
+    def test_missing_file(self):
+        index = PantryIndex()
+        self.assertEqual(index.search([self.ingredients[0].id]), [])
+        self.assertFalse(os.path.exists(INDEX_PATH))
+        self.build()
+        self.assertEqual(index.search([self.ingredients[0].id]),
+                         [(1 / 3, self.recipes[0].id)])
+
+    def test_build_if_stale(self):
+        self.build('--if-stale')
+        built = os.stat(INDEX_PATH).st_ino
+        self.build('--if-stale')
+        self.assertEqual(os.stat(INDEX_PATH).st_ino, built)
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.query_plans import CASES, run_case
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follower
+
+from .fixtures import (create_ingredients, create_recipes, create_tags,
+                       create_user)
+
+
+class QueryPlanTests(TestCase):
+    """Запросы API используют индексы и не сортируют упорядоченные выборки.
+
+    Команда check_query_plans проверяет те же случаи на текущих данных.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        authors = [create_user(f'author{index}') for index in range(3)]
+        cls.tags = create_tags()
+        cls.recipes = create_recipes(
+            authors + [cls.user], cls.tags, create_ingredients(10), 12
+        )
+        for author in authors:
+            Follower.objects.create(user=cls.user, author=author)
+        for recipe in cls.recipes[:3]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cases(self):
+        context = {
+            'user': self.user,
+            'author': self.recipes[0].author,
+            'recipe': self.recipes[0],
+            'tag': self.tags[0],
+        }
+        for case in CASES:
+            with self.subTest(case=case.name):
+                status, plans = run_case(case, context)
+                if status is not None:
+                    self.assertLess(status, 300)
+                self.assertTrue(plans)
+                self.assertEqual([
+                    (line, sql) for sql, _, found in plans for line in found
+                ], [])
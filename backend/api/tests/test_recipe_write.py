@@ -0,0 +1,153 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from recipes.models import (Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem)
+
+from .fixtures import (client_for, create_ingredients, create_recipes,
+                       create_tags, create_user)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+IMAGE = ('data:image/gif;base64,'
+         'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+INGREDIENTS = 50
+CREATE_QUERIES = 21
+UPDATE_QUERIES = 25
+UNCHANGED_UPDATE_QUERIES = 18
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteTests(APITestCase):
+    """Запись рецепта с ингредиентами за постоянное число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients(INGREDIENTS * 2)
+        cls.recipe = create_recipes(
+            [cls.author], cls.tags, cls.ingredients, 1,
+            ingredients_per_recipe=INGREDIENTS
+        )[0]
+        cls.buyer = create_user('buyer')
+        ShoppingCart.objects.create(user=cls.buyer, recipe=cls.recipe)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = client_for(self.author)
+
+    def payload(self, amounts, name='Рецепт'):
+        return {
+            'name': name, 'text': 'Описание', 'cooking_time': 10,
+            'image': IMAGE, 'tags': [self.tags[0].id],
+            'ingredients': [{'id': ingredient.id, 'amount': amount}
+                            for ingredient, amount in amounts],
+        }
+
+    def current_amounts(self):
+        return dict(self.recipe.recipe_ingredients.values_list(
+            'ingredient_id', 'amount'
+        ))
+
+    def test_create(self):
+        for count in (5, INGREDIENTS):
+            with self.subTest(ingredients=count):
+                cache.clear()
+                with self.assertNumQueries(CREATE_QUERIES):
+                    response = self.client.post(
+                        '/api/recipes/',
+                        self.payload((ingredient, 1) for ingredient
+                                     in self.ingredients[:count]),
+                        format='json'
+                    )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.json()['ingredients']), count)
+
+    def test_update_with_changes(self):
+        for changed in (1, 10):
+            with self.subTest(changed=changed):
+                cache.clear()
+                amounts = self.current_amounts()
+                kept = [ingredient for ingredient in self.ingredients
+                        if ingredient.id in amounts][changed:]
+                added = [ingredient for ingredient in self.ingredients
+                         if ingredient.id not in amounts][:changed]
+                expected = [
+                    (ingredient, amounts[ingredient.id] + position % 2)
+                    for position, ingredient in enumerate(kept)
+                ] + [(ingredient, 3) for ingredient in added]
+                with self.assertNumQueries(UPDATE_QUERIES):
+                    response = self.client.patch(
+                        f'/api/recipes/{self.recipe.id}/',
+                        self.payload(expected), format='json'
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.current_amounts(), {
+                    ingredient.id: amount for ingredient, amount in expected
+                })
+                self.assertEqual(dict(ShoppingListItem.objects.filter(
+                    user=self.buyer
+                ).values_list('ingredient_id', 'total_amount')),
+                    self.current_amounts())
+
+    def test_update_without_changes(self):
+        amounts = self.current_amounts()
+        with self.assertNumQueries(UNCHANGED_UPDATE_QUERIES):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                self.payload((ingredient, amounts[ingredient.id])
+                             for ingredient in self.ingredients
+                             if ingredient.id in amounts),
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.current_amounts(), amounts)
+
+    def test_unknown_ingredient_rolls_back(self):
+        recipes = Recipe.objects.count()
+        rows = RecipeIngredient.objects.count()
+        amounts = self.current_amounts()
+        unknown = max(ingredient.id for ingredient in self.ingredients) + 1
+        payload = self.payload((ingredient, 1)
+                               for ingredient in self.ingredients[:3])
+        payload['ingredients'].append({'id': unknown, 'amount': 1})
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/recipes/{self.recipe.id}/',
+                                     dict(payload, name='Изменен'),
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Recipe.objects.count(), recipes)
+        self.assertEqual(RecipeIngredient.objects.count(), rows)
+        self.assertEqual(self.current_amounts(), amounts)
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.name, 'Изменен')
+
+    def test_duplicate_ingredient_rolls_back(self):
+        recipes = Recipe.objects.count()
+        rows = RecipeIngredient.objects.count()
+        amounts = self.current_amounts()
+        ingredients = self.ingredients[INGREDIENTS:INGREDIENTS + 3]
+        payload = self.payload(
+            (ingredient, 1) for ingredient in ingredients + ingredients[:1]
+        )
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/recipes/{self.recipe.id}/',
+                                     dict(payload, name='Изменен'),
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Recipe.objects.count(), recipes)
+        self.assertEqual(RecipeIngredient.objects.count(), rows)
+        self.assertEqual(self.current_amounts(), amounts)
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.name, 'Изменен')
@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from api.cache import user_state_version
+from api.user_state import USER_STATE_KEY, UserState
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follower
+
+from .fixtures import (client_for, create_ingredients, create_recipes,
+                       create_tags, create_user)
+
+ANONYMOUS_QUERIES = 4
+AUTHENTICATED_QUERIES = 8
+
+
+class RecipeQueryCountTests(APITestCase):
+    """Число запросов к базе не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        authors = [create_user(f'author{index}') for index in range(3)]
+        cls.recipes = create_recipes(
+            authors, create_tags(), create_ingredients(30), 25
+        )
+        Follower.objects.create(user=cls.user, author=authors[0])
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_queries(self, client, url, queries):
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list(self):
+        for user, queries in ((None, ANONYMOUS_QUERIES),
+                              (self.user, AUTHENTICATED_QUERIES)):
+            for limit in (2, 20):
+                with self.subTest(user=user, limit=limit):
+                    cache.clear()
+                    data = self.assert_queries(
+                        client_for(user), f'/api/recipes/?limit={limit}',
+                        queries
+                    )
+                    self.assertEqual(len(data['results']), limit)
+
+    def test_detail(self):
+        for user, queries in ((None, ANONYMOUS_QUERIES),
+                              (self.user, AUTHENTICATED_QUERIES)):
+            for recipe in (self.recipes[0], self.recipes[-1]):
+                with self.subTest(user=user, recipe=recipe.id):
+                    cache.clear()
+                    data = self.assert_queries(
+                        client_for(user), f'/api/recipes/{recipe.id}/',
+                        queries
+                    )
+                    self.assertEqual(data['id'], recipe.id)
+
+    def test_detail_not_found(self):
+        for pk in ('²', '0', 'a'):
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/recipes/{pk}/')
+                self.assertEqual(response.status_code, 404)
+
+    def test_user_flags(self):
+        data = self.assert_queries(
+            client_for(self.user), '/api/recipes/?limit=25',
+            AUTHENTICATED_QUERIES
+        )
+        favorites = set(Favorite.objects.values_list('recipe_id', flat=True))
+        cart = set(ShoppingCart.objects.values_list('recipe_id', flat=True))
+        for item in data['results']:
+            self.assertEqual(item['is_favorited'], item['id'] in favorites)
+            self.assertEqual(item['is_in_shopping_cart'], item['id'] in cart)
+
+    def test_user_flags_after_changes(self):
+        client = client_for(self.user)
+        recipe = self.recipes[1]
+        url = f'/api/recipes/{recipe.id}/'
+        self.assertFalse(client.get(url).json()['is_favorited'])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'{url}favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(client.get(url).json()['is_favorited'])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.delete(f'{url}favorite/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(client.get(url).json()['is_favorited'])
+
+    def test_user_state_loaded_before_commit(self):
+        """Состояние, прочитанное до фиксации изменения, не кешируется."""
+        client = client_for(self.user)
+        recipe = self.recipes[1]
+        version = user_state_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=recipe)
+        cache.set(USER_STATE_KEY.format(user_id=self.user.id,
+                                        version=version),
+                  UserState(set(), set(), set()))
+        response = client.get(f'/api/recipes/{recipe.id}/')
+        self.assertTrue(response.json()['is_favorited'])
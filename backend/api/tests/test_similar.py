@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.indexes import SimilarRecipesIndex
+from recipes.similarity import (BUILD_MARGIN, SimilarityIndex,
+                                build_index_file, is_stale)
+
+from .fixtures import (create_ingredients, create_recipes, create_tags,
+                       create_user)
+
+INDEX_DIR = tempfile.mkdtemp()
+INDEX_PATH = os.path.join(INDEX_DIR, 'similarity.idx')
+
+
+@override_settings(SIMILARITY_INDEX_PATH=INDEX_PATH)
+class SimilarRecipesIndexTests(TestCase):
+    """Запросы только читают файл индекса, строит его команда."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes(
+            [create_user('author')], create_tags(), create_ingredients(4), 6
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(INDEX_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        if os.path.exists(INDEX_PATH):
+            os.unlink(INDEX_PATH)
+
+    def build(self, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('build_similarity_index', *args, output=INDEX_PATH,
+                         stdout=StringIO())
+
+    def test_missing_file(self):
+        index = SimilarRecipesIndex()
+        self.assertEqual(index.similar(self.recipes[0].id, 5), [])
+        self.assertFalse(os.path.exists(INDEX_PATH))
+        self.build()
+        self.assertTrue(index.similar(self.recipes[0].id, 5))
+
+    def test_is_stale(self):
+        build_index_file(INDEX_PATH)
+        with open(INDEX_PATH, 'rb') as file:
+            index = SimilarityIndex(file.read())
+        count = len(self.recipes)
+        # Все рецепты созданы позже built_at, но учитываются, только
+        # когда они старше BUILD_MARGIN.
+        for minimum, shift, stale in ((count - 1, 0, False),
+                                      (count, 2, False),
+                                      (count - 1, 2, True)):
+            now = timezone.now() + shift * BUILD_MARGIN
+            with self.subTest(minimum=minimum, shift=shift), mock.patch(
+                'recipes.similarity.REBUILD_MIN', minimum
+            ), mock.patch('recipes.similarity.timezone.now',
+                          return_value=now):
+                self.assertEqual(is_stale(index), stale)
+
+    def test_build_if_stale(self):
+        self.build('--if-stale')
+        self.assertTrue(os.path.exists(INDEX_PATH))
+        built = os.stat(INDEX_PATH).st_ino
+        self.build('--if-stale')
+        self.assertEqual(os.stat(INDEX_PATH).st_ino, built)
+        with mock.patch('recipes.similarity.REBUILD_MIN', 0), mock.patch(
+            'recipes.similarity.timezone.now',
+            return_value=timezone.now() + 2 * BUILD_MARGIN
+        ):
+            self.build('--if-stale')
+        self.assertNotEqual(os.stat(INDEX_PATH).st_ino, built)
+
+
+class SimilarRecipesViewTests(TestCase):
+    """Параметры запроса похожих рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipes(
+            [create_user('author')], create_tags(), create_ingredients(3), 1
+        )[0]
+
+    def test_invalid_id(self):
+        for pk in ('²', '0'):
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/recipes/{pk}/similar/')
+                self.assertEqual(response.status_code, 404)
+
+    def test_invalid_limit(self):
+        for limit in ('²', '-1', 'a'):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    f'/api/recipes/{self.recipe.id}/similar/',
+                    {'limit': limit}
+                )
+                self.assertEqual(response.status_code, 400)
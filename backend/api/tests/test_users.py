@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from users.models import Follower
+
+from .fixtures import (client_for, create_ingredients, create_recipes,
+                       create_tags, create_user)
+
+
+class SubscriptionsTests(APITestCase):
+    """Параметр recipes_limit списка подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        create_recipes([cls.author], create_tags(), create_ingredients(5), 3)
+        Follower.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = client_for(self.user)
+
+    def recipes_count(self, limit):
+        response = self.client.get('/api/users/subscriptions/',
+                                   {'recipes_limit': limit})
+        self.assertEqual(response.status_code, 200)
+        return len(response.json()['results'][0]['recipes'])
+
+    def test_recipes_limit(self):
+        for limit, count in (('', 3), ('0', 0), ('2', 2), ('10', 3)):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.recipes_count(limit), count)
+
+    def test_invalid_recipes_limit(self):
+        for limit in ('²', '-1', 'a'):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/users/subscriptions/',
+                                           {'recipes_limit': limit})
+                self.assertEqual(response.status_code, 400)
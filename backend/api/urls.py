@@ -3,7 +3,9 @@ from django.conf.urls.static import static
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .async_views import async_read_urls
+from .views import (IngredientViewSet, MetricsView, RecipeViewSet,
+                    ReferenceView, TagViewSet, UserViewSet)
 
 api_v1_router = DefaultRouter()
 
@@ -13,8 +15,16 @@ api_v1_router.register(r'recipes', RecipeViewSet, basename='recipes')
 api_v1_router.register(r'tags', TagViewSet, basename='tags')
 api_v1_router.register(r'users', UserViewSet, basename='users')
 
+router_urls = api_v1_router.urls
+if settings.ASYNC_READ_VIEWS:
+    router_urls = async_read_urls(router_urls)
+
 urlpatterns = [
-    path('', include(api_v1_router.urls)),
+    path('metrics/', MetricsView.as_view()),
+    path('reference/', ReferenceView.as_view()),
+    path('reference/<str:version>/', ReferenceView.as_view(),
+         name='reference'),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken'))
 ]
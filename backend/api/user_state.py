@@ -0,0 +1,63 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follower
+
+from .cache import user_state_version
+
+USER_STATE_KEY = 'user_state:{user_id}:{version}'
+
+
+class UserState:
+    """Избранное, корзина и подписки пользователя в виде множеств id."""
+
+    def __init__(self, favorites, shopping_cart, following):
+        self.favorites = favorites
+        self.shopping_cart = shopping_cart
+        self.following = following
+
+    @classmethod
+    def load(cls, user_id):
+        return cls(
+            favorites=set(Favorite.objects.filter(
+                user_id=user_id
+            ).values_list('recipe_id', flat=True)),
+            shopping_cart=set(ShoppingCart.objects.filter(
+                user_id=user_id
+            ).values_list('recipe_id', flat=True)),
+            following=set(Follower.objects.filter(
+                user_id=user_id
+            ).values_list('author_id', flat=True)),
+        )
+
+    def fingerprint(self):
+        """Хеш состояния для ETag ответов с флагами пользователя."""
+        state = (sorted(self.favorites), sorted(self.shopping_cart),
+                 sorted(self.following))
+        return md5(repr(state).encode()).hexdigest()
+
+
+def get_user_state(request):
+    """Состояние текущего пользователя, загружается один раз за запрос.
+
+    Кеш привязан к версии состояния: изменения сбрасывают версию, и
+    состояние, загруженное до их фиксации, больше не читается.
+    Для анонимного пользователя возвращает None.
+    """
+    if not request.user.is_authenticated:
+        return None
+    state = getattr(request, '_user_state', None)
+    if state is None:
+        user_id = request.user.id
+        key = USER_STATE_KEY.format(
+            user_id=user_id, version=user_state_version(user_id)
+        )
+        state = cache.get(key)
+        if state is None:
+            state = UserState.load(user_id)
+            cache.set(key, state, settings.USER_STATE_TIMEOUT)
+        request._user_state = state
+    return state
@@ -1,22 +1,112 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.http import (Http404, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django_filters import rest_framework as filters
-from django.shortcuts import get_object_or_404
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
 from users.models import User, Follower
+
+from .bulk import BulkFavorite, BulkShoppingCart, BulkSubscription, lock_user
+from .cache import (SHOPPING_CART_CONTENT_KEY, recipes_response_hash,
+                    recipes_response_key, shopping_cart_version)
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomLimitPagination
+from .indexes import ingredient_index, pantry_index, similar_recipes_index
+from .metrics import registry
+from .pagination import (CustomLimitPagination, FeedCursorPagination,
+                         RecipeCursorPagination)
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeDisplaySerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscriptionCreateSerializer,
-                          SubscriptionSerializer, TagSerializer)
+from .reference import get_reference
+from .renderers import (CSVShoppingListRenderer, JSONShoppingListRenderer,
+                        TextShoppingListRenderer)
+from .serializers import (BulkIdsSerializer, FavoriteSerializer,
+                          IngredientSerializer, PantryRecipeSerializer,
+                          PantrySearchSerializer, RecipeDisplaySerializer,
+                          RecipeSerializer, ShoppingCartSerializer,
+                          SubscriptionCreateSerializer, SubscriptionSerializer,
+                          TagSerializer, get_sparse_fields, is_expanded)
+from .user_state import get_user_state
+
+SIMILAR_RECIPES_LIMIT = 6
+SIMILAR_RECIPES_MAX_LIMIT = 50
+
+
+def bulk_response(request, relation):
+    """Пакетное добавление (POST) или удаление (DELETE) связей по id."""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    relation = relation(request.user)
+    ids = serializer.validated_data['ids']
+    results = (relation.add(ids) if request.method == 'POST'
+               else relation.remove(ids))
+    return Response([{'id': pk, 'status': result}
+                     for pk, result in results.items()])
+
+
+class ReferenceView(APIView):
+    """Справочник тегов и ингредиентов одним документом.
+
+    По адресу с версией документ отдается как неизменяемый, без версии -
+    с ETag для проверки актуальности.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request, version=None):
+        current_version, content = get_reference()
+        if version is not None and version != current_version:
+            return redirect('reference', version=current_version)
+        etag = f'"{current_version}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+            encoding = next(
+                (encoding for encoding in ('br', 'gzip')
+                 if encoding in content and encoding in accepted),
+                ''
+            )
+            response = HttpResponse(content[encoding],
+                                    content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = (
+            'public, max-age=31536000, immutable' if version is not None
+            else 'public, no-cache'
+        )
+        response['X-Reference-Version'] = current_version
+        return response
+
+
+class MetricsView(APIView):
+    """Метрики запросов в формате Prometheus."""
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            raise Http404
+        return HttpResponse(registry.collect(),
+                            content_type='text/plain; version=0.0.4')
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -30,17 +120,25 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов."""
 
+    queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filterset_class = IngredientFilter
     filter_backends = (filters.DjangoFilterBackend,)
 
-    def get_queryset(self):
-        queryset = Ingredient.objects.all()
-        name = self.request.query_params.get('name')
-        if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        """Поиск по названию выполняется по индексу в памяти."""
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        if limit is not None and not limit.isdecimal():
+            raise ValidationError(
+                {'limit': 'Должно быть целым неотрицательным числом.'}
+            )
+        return Response(ingredient_index.search(
+            name, limit=None if limit is None else int(limit)
+        ))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -53,14 +151,190 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (filters.DjangoFilterBackend,)
     pagination_class = CustomLimitPagination
 
+    @property
+    def paginator(self):
+        """Курсорная пагинация включается параметром cursor."""
+        if not hasattr(self, '_paginator'):
+            cursor_query_param = RecipeCursorPagination.cursor_query_param
+            if cursor_query_param in self.request.query_params:
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def cached_response(self, view, request, *args, **kwargs):
+        """Ответы анонимным пользователям кешируются до изменения данных.
+
+        Версии данных в ключе сбрасываются в общем кеше, поэтому правки
+        из админки и команд в других процессах видны сразу.
+        """
+        if request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = recipes_response_key(request, kwargs.get(self.lookup_field))
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RECIPES_CACHE_TIMEOUT)
+        return response
+
+    def conditional_response(self, view, request, etag, last_modified,
+                             *args, **kwargs):
+        """Ответ 304 без сериализации, если копия клиента актуальна.
+
+        Ответ зависит от избранного, корзины и подписок пользователя,
+        поэтому для авторизованных в ETag входит их состояние, а
+        Last-Modified не передается.
+        """
+        state = get_user_state(request)
+        if state is not None:
+            etag = f'{etag}-{state.fingerprint()}'
+            last_modified = None
+        etag = quote_etag(etag)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            response = self.cached_response(view, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, recipes_response_hash(request), None,
+            *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        if not pk.isdecimal():
+            raise Http404
+        updated_at = get_object_or_404(
+            Recipe.objects.values_list('updated_at', flat=True), pk=pk
+        )
+        etag = f'{pk}-{updated_at.timestamp()}'
+        fields, expand = get_sparse_fields(request)
+        if fields is not None:
+            etag += '-' + md5(
+                f'{sorted(fields)}{sorted(expand)}'.encode()
+            ).hexdigest()
+        return self.conditional_response(
+            super().retrieve, request, etag, int(updated_at.timestamp()),
+            *args, **kwargs
+        )
+
+    def get_queryset(self):
+        """Для чтения загружаются только связи запрошенных полей."""
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'feed', 'similar', 'pantry'):
+            fields, expand = get_sparse_fields(self.request)
+            queryset = queryset.with_related(
+                author=is_expanded('author', fields, expand),
+                tags=fields is None or 'tags' in fields,
+                ingredients=fields is None or 'ingredients' in fields
+            )
+            if fields is not None and 'text' not in fields:
+                queryset = queryset.defer('text')
+        return queryset
+
     def get_serializer_class(self):
-        if self.action == ('list', 'retrieve'):
+        if self.action == 'pantry':
+            return PantryRecipeSerializer
+        if self.action in ('list', 'retrieve', 'feed', 'similar'):
             return RecipeDisplaySerializer
         return RecipeSerializer
 
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь.
+
+        Страница ленты читается из FeedItem по индексу, затем рецепты
+        страницы загружаются одним запросом.
+        """
+        paginator = FeedCursorPagination()
+        items = paginator.paginate_queryset(
+            FeedItem.objects.filter(user=request.user), request, view=self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [item.recipe_id for item in items]
+        )
+        serializer = self.get_serializer(
+            [recipes[item.recipe_id] for item in items
+             if item.recipe_id in recipes],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=('get',))
+    def pantry(self, request):
+        """Рецепты по имеющимся ингредиентам.
+
+        Рецепты ранжируются по доле своих ингредиентов, которые есть в
+        параметре ingredients, по инвертированному индексу в памяти;
+        из базы загружается только страница ответа.
+        """
+        params = PantrySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ranked = pantry_index.search(
+            params.validated_data['ingredients'],
+            params.validated_data['min_coverage'],
+            params.validated_data.get('tags')
+        )
+        paginator = CustomLimitPagination()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, recipe_id in page]
+        )
+        for coverage, recipe_id in page:
+            if recipe_id in recipes:
+                recipes[recipe_id].coverage = coverage
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for _, recipe_id in page
+             if recipe_id in recipes],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=('get',))
+    def similar(self, request, pk=None):
+        """Рецепты с похожим набором ингредиентов.
+
+        Рецепты подбираются по индексу похожести, из базы загружается
+        только найденная страница. Удаленные после построения индекса
+        рецепты пропускаются, поэтому из индекса берется запас. Пока
+        индекс строится впервые, список пуст.
+        """
+        if not pk.isdecimal() or not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        limit = request.query_params.get('limit')
+        if limit is not None and not limit.isdecimal():
+            raise ValidationError(
+                {'limit': 'Должно быть целым неотрицательным числом.'}
+            )
+        limit = min(SIMILAR_RECIPES_MAX_LIMIT,
+                    SIMILAR_RECIPES_LIMIT if limit is None else int(limit))
+        ids = [recipe_id for _, recipe_id in similar_recipes_index.similar(
+            int(pk), limit * 2
+        )]
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in ids
+             if recipe_id in recipes][:limit],
+            many=True
+        )
+        return Response(serializer.data)
+
     @action(detail=True, methods=('post', 'delete'),
             permission_classes=(IsAuthenticated,))
+    @transaction.atomic
     def favorite(self, request, pk=None):
+        lock_user(request.user.id)
 
         if request.method == 'POST':
             serializer = FavoriteSerializer(
@@ -85,7 +359,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=('post', 'delete'),
             permission_classes=(IsAuthenticated,))
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
+        lock_user(request.user.id)
         if request.method == 'POST':
             serializer = ShoppingCartSerializer(
                 data={'user': request.user.id, 'recipe': pk, },
@@ -107,36 +383,85 @@ class RecipeViewSet(viewsets.ModelViewSet):
             cart_item.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=('get',),
+    @action(detail=False, methods=('post', 'delete'),
+            url_path='favorite/bulk', permission_classes=(IsAuthenticated,))
+    def favorite_bulk(self, request):
+        return bulk_response(request, BulkFavorite)
+
+    @action(detail=False, methods=('post', 'delete'),
+            url_path='shopping_cart/bulk',
             permission_classes=(IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        return bulk_response(request, BulkShoppingCart)
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(TextShoppingListRenderer,
+                              CSVShoppingListRenderer,
+                              JSONShoppingListRenderer))
     def download_shopping_cart(self, request):
+        """Выгрузка списка покупок в формате txt, csv или json.
+
+        Результат кешируется до изменения корзины пользователя, повторная
+        выгрузка не обращается к базе данных.
+        """
         user = request.user
-        ingredients = Ingredient.objects.filter(
-            recipe__shopping_cart__user=user
-        ).values(
-            'name', 'measurement_unit'
-        ).annotate(total_amount=Sum('recipe_ingredients__amount'))
-
-        content = ''
-        for ingredient in ingredients:
-            content += (
-                '{name} ({measurement_unit}) - {total_amount}\n'.format(
-                    name=ingredient['name'],
-                    measurement_unit=ingredient['measurement_unit'],
-                    total_amount=ingredient['total_amount']
-                )
-            )
+        renderer = request.accepted_renderer
+        version = shopping_cart_version(user.id)
+        etag = f'"{version}-{renderer.format}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
 
-        response = HttpResponse(content, content_type='text/plain')
+        cache_key = SHOPPING_CART_CONTENT_KEY.format(
+            user_id=user.id, version=version, format=renderer.format
+        )
+        content = cache.get(cache_key)
+        if content is not None:
+            response = HttpResponse(content, charset='utf-8')
+        else:
+            ingredients = ShoppingListItem.objects.filter(user=user).values(
+                'total_amount',
+                name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit')
+            ).order_by('name', 'measurement_unit')
+
+            def stream():
+                chunks = []
+                for chunk in renderer.stream(ingredients.iterator()):
+                    chunks.append(chunk)
+                    yield chunk
+                cache.set(cache_key, ''.join(chunks))
+
+            response = StreamingHttpResponse(stream(), charset='utf-8')
+        response['Content-Type'] = f'{renderer.media_type}; charset=utf-8'
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
         return response
 
 
 class UserViewSet(DjoserUserViewSet):
     """Вьюсет для пользователей."""
 
+    def get_recipes_limit(self):
+        """Параметр recipes_limit из запроса, None - без ограничения.
+
+        Как и раньше, пустое значение не ограничивает рецепты, а 0
+        оставляет список рецептов пустым.
+        """
+        limit = self.request.query_params.get('recipes_limit')
+        if not limit:
+            return None
+        if not limit.isdecimal():
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть целым неотрицательным числом.'}
+            )
+        return int(limit)
+
     @action(detail=False, methods=('get',), url_path='me',
             permission_classes=(IsAuthenticated,))
     def me(self, request):
@@ -149,25 +474,43 @@ class UserViewSet(DjoserUserViewSet):
     def subscriptions(self, request):
         """Метод для получения списка подписок."""
         user = request.user
+        limit = self.get_recipes_limit()
+        fields, expand = get_sparse_fields(request)
         subscriptions = User.objects.filter(following__user=user)
         paginator = CustomLimitPagination()
         paginator_queryset = paginator.paginate_queryset(subscriptions,
                                                          request)
+        if fields is None or 'recipes' in fields:
+            recipes = Recipe.objects.all()
+            if not is_expanded('recipes', fields, expand):
+                recipes = recipes.only('id', 'author')
+            if limit is not None:
+                recipes = recipes.filter(
+                    author__in=paginator_queryset
+                ).limited_per_author(limit)
+            prefetch_related_objects(
+                paginator_queryset,
+                Prefetch('recipes', queryset=recipes,
+                         to_attr='limited_recipes')
+            )
         serializer = SubscriptionSerializer(paginator_queryset, many=True,
                                             context={'request': request})
         return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=('post', 'delete'), url_path='subscribe',
             permission_classes=(IsAuthenticated,))
+    @transaction.atomic
     def subscribe(self, request, *args, **kwargs):
         """Метод для подписки и отписки."""
         user = request.user
+        lock_user(user.id)
         user_to_subscribe = self.get_object()
 
         if request.method == 'POST':
             serializer = SubscriptionCreateSerializer(
                 data={'user': user.id, 'author': user_to_subscribe.id},
-                context={'request': request, 'method': 'POST'}
+                context={'request': request, 'method': 'POST',
+                         'recipes_limit': self.get_recipes_limit()}
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
@@ -184,3 +527,9 @@ class UserViewSet(DjoserUserViewSet):
             subscription.delete()
             return Response({'status': 'Вы успешно отписались.'},
                             status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=('post', 'delete'),
+            url_path='subscribe/bulk', permission_classes=(IsAuthenticated,))
+    def subscribe_bulk(self, request):
+        """Пакетная подписка и отписка."""
+        return bulk_response(request, BulkSubscription)
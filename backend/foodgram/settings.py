@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +93,42 @@ else:
     }
     }
 
+# Кеш общий для всех процессов: по версиям в нем воркеры и команды
+# manage.py сбрасывают кеши ответов, токенов и индексы в памяти друг
+# друга. В docker-compose это Redis, без REDIS_URL - файловый кеш.
+REDIS_URL = env('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': env(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.filebased.FileBasedCache'
+            ),
+            'LOCATION': env('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        }
+    }
+
+RECIPES_CACHE_TIMEOUT = env.int('RECIPES_CACHE_TIMEOUT', 300)
+USER_STATE_TIMEOUT = env.int('USER_STATE_TIMEOUT', 600)
+AUTH_TOKEN_CACHE_TIMEOUT = env.int('AUTH_TOKEN_CACHE_TIMEOUT', 60)
+
+ASYNC_READ_VIEWS = env.bool('ASYNC_READ_VIEWS', default=False)
+
+SIMILARITY_INDEX_PATH = env.str('SIMILARITY_INDEX_PATH',
+                                str(BASE_DIR / 'similarity.idx'))
+PANTRY_INDEX_PATH = env.str('PANTRY_INDEX_PATH',
+                            str(BASE_DIR / 'pantry.idx'))
+
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=False)
+METRICS_DIR = env('METRICS_DIR', '')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -133,7 +170,11 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomLimitPagination',
     'PAGE_SIZE': 6,
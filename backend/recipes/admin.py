@@ -1,5 +1,4 @@
 from django.contrib import admin
-from django.db.models import Count
 
 from .models import Favorite, Ingredient, Recipe, RecipeIngredient, Tag
 
@@ -26,21 +25,10 @@ class TagAdmin(admin.ModelAdmin):
 class RecipeAdmin(admin.ModelAdmin):
     """Рецепты в админке."""
 
-    list_display = ('name', 'author', 'favorites_count')
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
     search_fields = ('name',)
     list_filter = ('name', 'author', 'tags')
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request).annotate(
-            _favorites_count=Count('favorites')
-        )
-        return queryset
-
-    def favorites_count(self, obj):
-        return obj._favorites_count
-    favorites_count.admin_order_field = '_favorites_count'
-    favorites_count.short_description = 'Кол-во в избранном'
-
 
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,43 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Follower, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': (Favorite, 'recipe'),
+        'in_carts_count': (ShoppingCart, 'recipe'),
+    },
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Follower, 'author'),
+    },
+}
+
+
+def count_subquery(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('*')).values('count')
+    ), 0)
+
+
+def recount(model, queryset=None):
+    """Пересчитывает счетчики модели одним запросом UPDATE."""
+    if queryset is None:
+        queryset = model.objects.all()
+    return queryset.update(**{
+        counter: count_subquery(*source)
+        for counter, source in COUNTERS[model].items()
+    })
+
+
+def change_counter(model, pks, counter, delta):
+    """Атомарно изменяет счетчик объектов, не опуская его ниже нуля."""
+    model.objects.filter(pk__in=pks).update(
+        **{counter: Greatest(F(counter) + delta, 0)}
+    )
@@ -0,0 +1,59 @@
+from django.db.models import F
+
+from users.models import Follower
+
+from .models import FeedItem, Recipe
+
+BATCH_SIZE = 1000
+
+
+def create_feed_items(rows):
+    """Добавляет записи лент, пропуская уже существующие.
+
+    Строки - словари с user_id, recipe_id, author_id и pub_date.
+    """
+    FeedItem.objects.bulk_create(
+        (FeedItem(**row) for row in rows),
+        batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out_recipe(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    create_feed_items(
+        {'user_id': user_id, 'recipe_id': recipe.id,
+         'author_id': recipe.author_id, 'pub_date': recipe.pub_date}
+        for user_id in Follower.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True).iterator()
+    )
+
+
+def backfill_feed(user_id, author_ids):
+    """Добавляет в ленту пользователя рецепты новых авторов."""
+    create_feed_items(
+        {'user_id': user_id, **row}
+        for row in Recipe.objects.filter(author_id__in=author_ids).values(
+            'author_id', 'pub_date', recipe_id=F('id')
+        ).order_by().iterator()
+    )
+
+
+def trim_feed(user_id, author_ids):
+    """Убирает из ленты пользователя рецепты авторов после отписки."""
+    FeedItem.objects.filter(user_id=user_id,
+                            author_id__in=author_ids).delete()
+
+
+def rebuild_feeds(user_ids=None):
+    """Пересобирает ленты по подпискам, без user_ids - все ленты."""
+    items = FeedItem.objects.all()
+    follows = Follower.objects.filter(author__recipes__isnull=False)
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    items.delete()
+    create_feed_items(follows.order_by().values(
+        'user_id', 'author_id', recipe_id=F('author__recipes'),
+        pub_date=F('author__recipes__pub_date')
+    ).iterator())
@@ -0,0 +1,51 @@
+import mmap
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_pantry_version
+from recipes.pantry import PostingIndex, build_index_file
+from recipes.similarity import is_stale
+
+
+class Command(BaseCommand):
+
+    help = ('Построение инвертированного индекса рецептов по ингредиентам '
+            'для поиска по имеющимся продуктам. Файл заменяется атомарно, '
+            'работающие процессы подхватывают его при следующем запросе. '
+            'Сами запросы индекс не строят, команду запускают по '
+            'расписанию с --if-stale.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.PANTRY_INDEX_PATH,
+                            help='Путь к файлу индекса')
+        parser.add_argument('--if-stale', action='store_true',
+                            help='Строить, только если файла нет или '
+                                 'изменилось много рецептов')
+
+    def is_fresh(self, path):
+        """Файл индекса есть и не устарел."""
+        try:
+            with open(path, 'rb') as file:
+                index = PostingIndex.load(mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                ))
+        except (FileNotFoundError, ValueError):
+            return False
+        return not is_stale(index)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        output = options['output']
+        if options['if_stale'] and self.is_fresh(output):
+            self.stdout.write('Индекс по ингредиентам актуален.')
+            return
+        count = build_index_file(output)
+        bump_pantry_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс по ингредиентам построен за '
+            f'{time.monotonic() - started:.1f} с: рецептов {count}, '
+            f'{os.path.getsize(output) / 1024 / 1024:.1f} МБ, {output}'
+        ))
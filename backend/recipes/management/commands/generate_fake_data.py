@@ -0,0 +1,154 @@
+import random
+import time
+from itertools import islice
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from api.cache import (bump_ingredients_version, bump_pantry_version,
+                       bump_recipe_versions, bump_similar_recipes_version,
+                       bump_tags_version)
+from recipes.counters import COUNTERS, recount
+from recipes.feed import rebuild_feeds
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.search import rebuild_index
+from recipes.shopping_list import refresh_shopping_lists
+from users.models import Follower, User
+
+DEFAULT_BATCH_SIZE = 5000
+FAKE_IMAGE = 'recipes/temp.png'
+FAKE_PASSWORD = 'fake-password'
+WORDS = (
+    'борщ', 'суп', 'салат', 'курица', 'говядина', 'свинина', 'рыба', 'рис',
+    'паста', 'сыр', 'томат', 'грибы', 'пирог', 'блины', 'каша', 'овощи',
+    'запеченный', 'жареный', 'домашний', 'быстрый', 'острый', 'сладкий',
+    'с', 'и', 'по-деревенски', 'в', 'духовке', 'сливочный', 'соусом',
+)
+
+
+class Command(BaseCommand):
+
+    help = 'Генерация тестовых пользователей, рецептов, избранного и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Начальное значение генератора')
+
+    def step(self, message, started):
+        self.stdout.write(f'{message} ({time.monotonic() - started:.1f} с)')
+
+    def bulk_create(self, model, objects):
+        """Сохраняет объекты пакетами, не создавая их все сразу в памяти."""
+        objects = iter(objects)
+        for batch in iter(lambda: list(islice(objects, self.batch_size)), []):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно минимум 2 пользователя и 1 рецепт.')
+        self.batch_size = options['batch_size']
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            self.bulk_create(Ingredient, (
+                Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+                for i in range(1000)
+            ))
+            ingredient_ids = list(
+                Ingredient.objects.values_list('id', flat=True)
+            )
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not tag_ids:
+            self.bulk_create(Tag, (
+                Tag(name=f'Тег {i}', color='#000000', slug=f'tag{i}')
+                for i in range(5)
+            ))
+            tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+        prefix = f'fake_{uuid4().hex[:8]}'
+        password = make_password(FAKE_PASSWORD)
+        self.bulk_create(User, (
+            User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for i in range(options['users'])
+        ))
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).values_list('id', flat=True))
+        self.step(f'Пользователи: {len(user_ids)}', started)
+
+        self.bulk_create(Recipe, (
+            Recipe(
+                name=' '.join(rng.choices(WORDS, k=3)).capitalize(),
+                text=' '.join(rng.choices(WORDS, k=40)),
+                cooking_time=rng.randint(5, 180),
+                author_id=rng.choice(user_ids),
+                image=FAKE_IMAGE,
+            )
+            for _ in range(options['recipes'])
+        ))
+        recipe_ids = list(Recipe.objects.filter(
+            author_id__in=user_ids
+        ).values_list('id', flat=True))
+        self.step(f'Рецепты: {len(recipe_ids)}', started)
+
+        ingredients_count = min(options['ingredients_per_recipe'],
+                                len(ingredient_ids))
+        tags_count = min(options['tags_per_recipe'], len(tag_ids))
+        self.bulk_create(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(ingredient_ids, ingredients_count)
+        ))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, tags_count)
+        ))
+        self.step('Ингредиенты и теги рецептов', started)
+
+        for model, per_user, field, targets in (
+            (Favorite, options['favorites_per_user'], 'recipe_id',
+             recipe_ids),
+            (ShoppingCart, options['carts_per_user'], 'recipe_id',
+             recipe_ids),
+            (Follower, options['follows_per_user'], 'author_id', user_ids),
+        ):
+            self.bulk_create(model, (
+                model(user_id=user_id, **{field: target})
+                for user_id in user_ids
+                for target in rng.sample(targets, min(per_user, len(targets)))
+                if target != user_id or field != 'author_id'
+            ))
+            self.step(model._meta.verbose_name_plural, started)
+
+        for model in COUNTERS:
+            recount(model)
+        rebuild_index(DEFAULT_DB_ALIAS)
+        refresh_shopping_lists(user_ids)
+        rebuild_feeds(user_ids)
+        bump_recipe_versions(())
+        bump_similar_recipes_version()
+        bump_pantry_version()
+        bump_tags_version()
+        bump_ingredients_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с. '
+            f'Пароль пользователей {prefix}_N@example.com: {FAKE_PASSWORD}'
+        ))
@@ -1,35 +1,177 @@
+import csv
 import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand, CommandParser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import bump_ingredients_version, bump_tags_version
 from recipes.models import Ingredient, Tag
 
+DEFAULT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+FORMATS = {'.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson',
+           '.csv': 'csv'}
+
+
+def read_json(file):
+    """Построчно читает объекты из JSON-массива, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                obj, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield obj
+    if buffer[position:].strip():
+        raise CommandError('Некорректный JSON-файл.')
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+READERS = {'json': read_json, 'ndjson': read_ndjson, 'csv': read_csv}
+
+
+class TagImporter:
+    """Добавляет новые теги и обновляет существующие по слагу."""
+
+    model = Tag
+    fields = ('name', 'color', 'slug')
+
+    def import_batch(self, rows):
+        tags = {row['slug']: row for row in rows}
+        existing = Tag.objects.in_bulk(tags, field_name='slug')
+        changed = []
+        for slug, tag in existing.items():
+            row = tags.pop(slug)
+            if (tag.name, tag.color) != (row['name'], row['color']):
+                tag.name, tag.color = row['name'], row['color']
+                changed.append(tag)
+        Tag.objects.bulk_update(changed, ('name', 'color'))
+        Tag.objects.bulk_create(
+            (Tag(**row) for row in tags.values()), ignore_conflicts=True
+        )
+        return len(tags), len(changed)
+
+
+class IngredientImporter:
+    """Добавляет ингредиенты, которых еще нет в базе."""
+
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+
+    def import_batch(self, rows):
+        ingredients = {(row['name'], row['measurement_unit']) for row in rows}
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in ingredients}
+        ).values_list('name', 'measurement_unit'))
+        ingredients -= existing
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in ingredients),
+            ignore_conflicts=True
+        )
+        return len(ingredients), 0
+
+
+IMPORTERS = (TagImporter, IngredientImporter)
+
 
 class Command(BaseCommand):
 
-    help = 'Импорт данных из JSON-файлов'
+    help = 'Импорт тегов и ингредиентов из файлов JSON, NDJSON и CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Путь к файлу')
+        parser.add_argument('--format', choices=READERS,
+                            help='Формат файла, по умолчанию - по расширению')
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE,
+                            help='Количество строк в одной транзакции')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Проверить файл без записи в базу')
 
-    def add_arguments(self, parser: CommandParser) -> None:
-        parser.add_argument('path', type=str, help='Пусть к JSON-файлу')
+    def get_importer(self, row):
+        for importer in IMPORTERS:
+            if set(importer.fields) <= row.keys():
+                return importer()
+        raise CommandError(f'Неизвестный формат строки: {row}')
 
     def handle(self, *args, **options):
-        path = options['path']
-        if not Tag.objects.exists():
-            with open(path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                if 'color' in data[0]:
-                    for line in data:
-                        Tag.objects.create(
-                            name=line['name'],
-                            color=line['color'],
-                            slug=line['slug']
-                        )
-        if not Ingredient.objects.exists():
-            with open(path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                if 'measurement_unit' in data[0]:
-                    for line in data:
-                        Ingredient.objects.create(
-                            name=line['name'],
-                            measurement_unit=line['measurement_unit']
-                        )
+        path = Path(options['path'])
+        file_format = options['format'] or FORMATS.get(path.suffix.lower())
+        if file_format is None:
+            raise CommandError(f'Не удалось определить формат файла {path}')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть положительным.')
+        dry_run = options['dry_run']
+
+        processed = created = updated = 0
+        importer = None
+        started = time.monotonic()
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            rows = READERS[file_format](file)
+            for batch in iter(lambda: list(islice(rows, batch_size)), []):
+                if importer is None:
+                    importer = self.get_importer(batch[0])
+                try:
+                    batch = [{field: row[field] for field in importer.fields}
+                             for row in batch]
+                except KeyError as err:
+                    raise CommandError(
+                        f'В строке {processed + 1} и далее нет поля {err}'
+                    ) from err
+                with transaction.atomic():
+                    batch_created, batch_updated = importer.import_batch(batch)
+                    if dry_run:
+                        transaction.set_rollback(True)
+                processed += len(batch)
+                created += batch_created
+                updated += batch_updated
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Обработано {processed} строк '
+                    f'({processed / elapsed:.0f} строк/с)'
+                )
+
+        # bulk_create не вызывает сигналы. Версии сбрасываются в общем
+        # кеше, поэтому справочник и индексы обновятся и в работающих
+        # процессах API.
+        if importer is not None and not dry_run:
+            if importer.model is Tag:
+                bump_tags_version()
+            else:
+                bump_ingredients_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверка завершена" if dry_run else "Импорт завершен"}: '
+            f'строк {processed}, добавлено {created}, обновлено {updated}'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild_feeds
+from recipes.models import FeedItem
+from users.models import Follower
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+
+    help = 'Пересборка лент подписок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE,
+                            help='Количество пользователей в одной транзакции')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            removed, _ = FeedItem.objects.exclude(
+                user_id__in=Follower.objects.values('user_id')
+            ).delete()
+        user_ids = list(Follower.objects.order_by('user_id').values_list(
+            'user_id', flat=True
+        ).distinct())
+        for start in range(0, len(user_ids), batch_size):
+            with transaction.atomic():
+                rebuild_feeds(user_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобраны ленты пользователей: {len(user_ids)}, '
+            f'удалено лишних записей: {removed}'
+        ))
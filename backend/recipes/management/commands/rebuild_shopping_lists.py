@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.cache import bump_shopping_cart_versions
+from recipes.models import ShoppingCart, ShoppingListItem
+from recipes.shopping_list import refresh_shopping_lists
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+
+    help = 'Пересчет списков покупок пользователей по их корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE,
+                            help='Количество пользователей в одной транзакции')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            removed, _ = ShoppingListItem.objects.exclude(
+                user_id__in=ShoppingCart.objects.values('user_id')
+            ).delete()
+        user_ids = list(ShoppingCart.objects.order_by('user_id').values_list(
+            'user_id', flat=True
+        ).distinct())
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            with transaction.atomic():
+                refresh_shopping_lists(batch)
+                bump_shopping_cart_versions(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны списки покупок пользователей: {len(user_ids)}, '
+            f'удалено лишних позиций: {removed}'
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import COUNTERS, recount
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+
+    help = 'Пересчет счетчиков избранного, корзин, рецептов и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE,
+                            help='Количество объектов в одной транзакции')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть положительным.')
+        for model in COUNTERS:
+            pks = model.objects.order_by('pk').values_list('pk', flat=True)
+            updated = 0
+            last_pk = 0
+            while True:
+                batch = list(pks.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1]
+                with transaction.atomic():
+                    updated += recount(
+                        model, model.objects.filter(pk__in=batch)
+                    )
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: пересчитано {updated}'
+            ))
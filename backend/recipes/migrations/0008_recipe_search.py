@@ -0,0 +1,43 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX recipe_search_vector_idx ON recipes_recipe "
+    "USING GIN (search_vector)",
+)
+POSTGRES_BACKWARD = (
+    "ALTER TABLE recipes_recipe DROP COLUMN search_vector",
+)
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(name, text)",
+    "INSERT INTO recipes_recipe_fts(rowid, name, text) "
+    "SELECT id, name, text FROM recipes_recipe",
+)
+SQLITE_BACKWARD = (
+    "DROP TABLE recipes_recipe_fts",
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
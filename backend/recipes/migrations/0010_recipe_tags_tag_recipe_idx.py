@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_shopping_list'),
+    ]
+
+    # Таблица связи создается автоматически, индекс добавляется SQL.
+    # Уникальный (recipe_id, tag_id) уже покрывает EXISTS по рецепту,
+    # (tag_id, recipe_id) - выборку рецептов по выбранным тегам.
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx'
+        ),
+    ]
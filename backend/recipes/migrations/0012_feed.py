@@ -0,0 +1,54 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:57
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    Follower = apps.get_model('users', 'Follower')
+    FeedItem = apps.get_model('recipes', 'FeedItem')
+    rows = Follower.objects.order_by().values(
+        'user_id', 'author_id', recipe_id=F('author__recipes'),
+        pub_date=F('author__recipes__pub_date')
+    ).filter(recipe_id__isnull=False)
+    FeedItem.objects.bulk_create(
+        (FeedItem(**row) for row in rows.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0011_recipe_updated_at'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Проверка на уникальность рецепта в ленте'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:12
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Префиксный поиск ингредиентов (name__istartswith) в PostgreSQL
+# сравнивает UPPER(name) через LIKE, в SQLite - LIKE без учета регистра.
+POSTGRES_FORWARD = (
+    "CREATE INDEX ingredient_name_upper_idx ON recipes_ingredient "
+    "(UPPER(name::text) text_pattern_ops)",
+)
+SQLITE_FORWARD = (
+    "CREATE INDEX ingredient_name_upper_idx ON recipes_ingredient "
+    "(name COLLATE NOCASE)",
+)
+BACKWARD = (
+    "DROP INDEX ingredient_name_upper_idx",
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    duplicates = Favorite.objects.order_by().values(
+        'user', 'recipe'
+    ).annotate(first_id=Min('id'), count=Count('*')).filter(count__gt=1)
+    recipe_ids = set()
+    for row in duplicates.iterator():
+        Favorite.objects.filter(
+            user_id=row['user'], recipe_id=row['recipe']
+        ).exclude(id=row['first_id']).delete()
+        recipe_ids.add(row['recipe'])
+    if recipe_ids:
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            favorites_count=Coalesce(Subquery(
+                Favorite.objects.filter(recipe=OuterRef('pk')).order_by(
+                ).values('recipe').annotate(count=Count('*')).values('count')
+            ), 0)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites,
+                             migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранные'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'verbose_name': 'Корзина', 'verbose_name_plural': 'Корзины'},
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at'], name='recipe_updated_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Проверка на уникальность рецепта в избранном'),
+        ),
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': BACKWARD, 'sqlite': BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.16 on 2026-10-18 14:20
+
+from django.db import migrations
+
+# Поиск ингредиентов по префиксу обслуживается индексом в памяти
+# (api.indexes.IngredientIndex), индекс по UPPER(name) не используется.
+FORWARD = (
+    "DROP INDEX IF EXISTS ingredient_name_upper_idx",
+)
+POSTGRES_BACKWARD = (
+    "CREATE INDEX ingredient_name_upper_idx ON recipes_ingredient "
+    "(UPPER(name::text) text_pattern_ops)",
+)
+SQLITE_BACKWARD = (
+    "CREATE INDEX ingredient_name_upper_idx ON recipes_ingredient "
+    "(name COLLATE NOCASE)",
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_favorite_unique_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': FORWARD, 'sqlite': FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
 
-from users.models import User
+from users.models import CountersMixin, User
+
+from .search import search
 
 
 class Ingredient(models.Model):
@@ -15,6 +19,12 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='Проверка на уникальность ингредиента'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -36,7 +46,47 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Запросы для рецептов."""
+
+    def with_related(self, author=True, tags=True, ingredients=True):
+        """Рецепты с автором, тегами и ингредиентами.
+
+        Количество запросов не зависит от числа рецептов на странице.
+        Ненужные связи можно не загружать, передав False.
+        """
+        queryset = self
+        if author:
+            queryset = queryset.select_related('author')
+        if tags:
+            queryset = queryset.prefetch_related('tags')
+        if ingredients:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ))
+        return queryset
+
+    def search(self, query):
+        """Полнотекстовый поиск по названию и описанию с ранжированием."""
+        return search(self, query)
+
+    def limited_per_author(self, limit):
+        """Не более limit последних рецептов каждого автора одним запросом."""
+        ranked = self.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=models.F('author'),
+            order_by=(models.F('pub_date').desc(), models.F('id').desc())
+        )).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта."""
 
     name = models.CharField(max_length=200, verbose_name='Название')
@@ -57,11 +107,31 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(Tag, verbose_name='Теги')
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Кол-во в избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Кол-во в корзинах'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counters = ('favorites_count', 'in_carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('updated_at',),
+                         name='recipe_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -105,7 +175,12 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
-        ordering = ('-recipe__pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='Проверка на уникальность рецепта в избранном'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user} добавил в избранное рецепт {self.recipe}'
@@ -128,7 +203,71 @@ class ShoppingCart(models.Model):
                 name='Проверка на уникальность рецепта в корзине'
             )
         ]
-        ordering = ('-recipe__name',)
 
     def __str__(self):
         return f'{self.user} добавил в корзину рецепт {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+
+    Поддерживается при изменении корзины и ингредиентов рецептов.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shopping_list',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='+',
+                                   verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(default=0,
+                                               verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='Проверка на уникальность ингредиента в списке покупок'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.total_amount}'
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Записи добавляются при публикации рецепта и подписке на автора и
+    удаляются при отписке. Автор и дата публикации дублируются из
+    рецепта, чтобы лента читалась по индексу без соединений.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='feed',
+                             verbose_name='Пользователь')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='feed_items',
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+', verbose_name='Автор')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='Проверка на уникальность рецепта в ленте'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
@@ -0,0 +1,161 @@
+import json
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from itertools import chain, groupby
+from operator import itemgetter
+
+from django.utils import timezone
+
+from .models import Recipe, RecipeIngredient
+from .similarity import BUILD_MARGIN, HEADER
+from .utils import replace_file
+
+MAGIC = b'FGPAN001'
+# Разделы файла: имя, тип элементов array. Списки рецептов ингредиентов
+# и тегов хранятся подряд, offsets - их границы.
+SECTIONS = (
+    ('recipe_ids', 'q'),
+    ('sizes', 'q'),
+    ('ingredient_ids', 'q'),
+    ('ingredient_offsets', 'Q'),
+    ('ingredient_recipes', 'q'),
+    ('tag_ids', 'q'),
+    ('tag_offsets', 'Q'),
+    ('tag_recipes', 'q'),
+)
+
+
+def posting_lists(pairs):
+    """Словарь {ключ: отсортированный array id рецептов}.
+
+    pairs - пары (ключ, id рецепта), упорядоченные по ключу и id.
+    """
+    return {
+        key: array('q', map(itemgetter(1), group))
+        for key, group in groupby(pairs, key=itemgetter(0))
+    }
+
+
+def recipe_sets(pairs):
+    """Словарь {id рецепта: множество ключей} из пар (id рецепта, ключ)."""
+    sets = {}
+    for recipe_id, key in pairs:
+        sets.setdefault(recipe_id, set()).add(key)
+    return sets
+
+
+class PostingIndex:
+    """Инвертированный индекс рецептов по ингредиентам и тегам.
+
+    Для каждого ингредиента и тега хранится отсортированный массив id
+    рецептов, для каждого рецепта - число его ингредиентов.
+    """
+
+    def __init__(self, ingredients, tags, sizes, built_at):
+        self.ingredients = ingredients
+        self.tags = tags
+        self.sizes = sizes
+        self.built_at = built_at
+
+    @classmethod
+    def build(cls):
+        built_at = timezone.now() - BUILD_MARGIN
+        ingredients = posting_lists(
+            RecipeIngredient.objects.order_by(
+                'ingredient_id', 'recipe_id'
+            ).values_list('ingredient_id', 'recipe_id').iterator()
+        )
+        tags = posting_lists(
+            Recipe.tags.through.objects.order_by(
+                'tag_id', 'recipe_id'
+            ).values_list('tag_id', 'recipe_id').iterator()
+        )
+        sizes = Counter(chain.from_iterable(ingredients.values()))
+        return cls(ingredients, tags, sizes, built_at)
+
+    def write(self, stream):
+        """Записывает индекс в бинарный поток, возвращает число рецептов.
+
+        Формат как у индекса похожести: заголовок, метаданные в JSON и
+        разделы SECTIONS, которые читаются через memoryview без разбора.
+        """
+        sections = {
+            'recipe_ids': array('q', sorted(self.sizes)),
+        }
+        sections['sizes'] = array('q', map(
+            self.sizes.__getitem__, sections['recipe_ids']
+        ))
+        for name, lists in (('ingredient', self.ingredients),
+                            ('tag', self.tags)):
+            keys = sorted(lists)
+            offsets = array('Q', (0,))
+            recipes = array('q')
+            for key in keys:
+                recipes.extend(lists[key])
+                offsets.append(len(recipes))
+            sections[f'{name}_ids'] = array('q', keys)
+            sections[f'{name}_offsets'] = offsets
+            sections[f'{name}_recipes'] = recipes
+        meta = json.dumps({
+            'built_at': self.built_at.isoformat(),
+            'sections': [len(sections[name]) for name, _ in SECTIONS],
+        }).encode()
+        meta += b' ' * (-(HEADER.size + len(meta)) % 8)
+        stream.write(HEADER.pack(MAGIC, len(meta)))
+        stream.write(meta)
+        for name, _ in SECTIONS:
+            stream.write(sections[name].tobytes())
+        return len(self)
+
+    @classmethod
+    def load(cls, buffer):
+        """Индекс из буфера write(), например отображенного в память файла.
+
+        Списки рецептов не копируются, а ссылаются на буфер.
+        """
+        view = memoryview(buffer)
+        magic, meta_size = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError('Неизвестный формат индекса по ингредиентам.')
+        meta = json.loads(bytes(view[HEADER.size:HEADER.size + meta_size]))
+        sections = {}
+        position = HEADER.size + meta_size
+        for (name, typecode), size in zip(SECTIONS, meta['sections']):
+            end = position + size * 8
+            sections[name] = view[position:end].cast(typecode)
+            position = end
+        lists = {}
+        for name in ('ingredient', 'tag'):
+            offsets = sections[f'{name}_offsets']
+            recipes = sections[f'{name}_recipes']
+            lists[name] = {
+                key: recipes[offsets[index]:offsets[index + 1]]
+                for index, key in enumerate(sections[f'{name}_ids'])
+            }
+        return cls(lists['ingredient'], lists['tag'],
+                   dict(zip(sections['recipe_ids'], sections['sizes'])),
+                   datetime.fromisoformat(meta['built_at']))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def has_any_tag(self, recipe_id, tag_ids):
+        """Есть ли у рецепта хотя бы один из тегов (двоичный поиск)."""
+        for tag_id in tag_ids:
+            recipe_ids = self.tags.get(tag_id, ())
+            index = bisect_left(recipe_ids, recipe_id)
+            if index < len(recipe_ids) and recipe_ids[index] == recipe_id:
+                return True
+        return False
+
+
+def build_index_file(path):
+    """Строит индекс в файл path с атомарной заменой.
+
+    Возвращает число рецептов в индексе.
+    """
+    return replace_file(path, lambda stream: PostingIndex.build().write(
+        stream
+    ))
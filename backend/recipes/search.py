@@ -0,0 +1,89 @@
+import re
+
+from django.db import connections
+
+POSTGRES_SEARCH = {
+    'select': {'search_rank': (
+        "ts_rank(recipes_recipe.search_vector, "
+        "websearch_to_tsquery('russian', %s))"
+    )},
+    'where': [
+        "recipes_recipe.search_vector @@ websearch_to_tsquery('russian', %s)"
+    ],
+    'tables': [],
+}
+SQLITE_SEARCH = {
+    'select': {'search_rank': '-bm25(recipes_recipe_fts, 10.0, 1.0)'},
+    'where': [
+        'recipes_recipe_fts MATCH %s',
+        'recipes_recipe_fts.rowid = recipes_recipe.id',
+    ],
+    'tables': ['recipes_recipe_fts'],
+}
+
+
+def sqlite_query(query):
+    """Запрос FTS5: все слова с поиском по префиксу."""
+    return ' '.join(
+        '"{}"*'.format(word) for word in re.findall(r'\w+', query)
+    )
+
+
+def search(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию релевантности."""
+    if connections[queryset.db].vendor == 'postgresql':
+        options = POSTGRES_SEARCH
+    else:
+        options = SQLITE_SEARCH
+        query = sqlite_query(query)
+        if not query:
+            return queryset.none()
+    return queryset.extra(
+        select_params=(query,), params=(query,), **options
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+def index_recipe(recipe, using):
+    """Обновляет полнотекстовый индекс SQLite для рецепта.
+
+    В PostgreSQL вектор поиска - генерируемый столбец и обновляется сам.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM recipes_recipe_fts WHERE rowid = %s', (recipe.id,)
+        )
+        cursor.execute(
+            'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+            'VALUES (%s, %s, %s)',
+            (recipe.id, recipe.name, recipe.text)
+        )
+
+
+def unindex_recipe(recipe, using):
+    """Удаляет рецепт из полнотекстового индекса SQLite."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM recipes_recipe_fts WHERE rowid = %s', (recipe.id,)
+        )
+
+
+def rebuild_index(using):
+    """Заново заполняет полнотекстовый индекс SQLite.
+
+    Нужен после массовых операций, которые не вызывают сигналы.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM recipes_recipe_fts')
+        cursor.execute(
+            'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+            'SELECT id, name, text FROM recipes_recipe'
+        )
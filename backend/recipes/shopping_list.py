@@ -0,0 +1,86 @@
+from django.db.models import (Case, F, IntegerField, OuterRef, Subquery, Sum,
+                              Value, When)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def change_shopping_list(user_id, recipe_ids, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов.
+
+    Вызывается, пока рецепты и их ингредиенты еще существуют.
+    """
+    amounts = dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by().values('ingredient_id').annotate(
+        total=Sum('amount')
+    ).values_list('ingredient_id', 'total'))
+    if not amounts:
+        return
+    if sign > 0:
+        ShoppingListItem.objects.bulk_create(
+            (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+             for ingredient_id in amounts),
+            ignore_conflicts=True
+        )
+    items = ShoppingListItem.objects.filter(user_id=user_id,
+                                            ingredient_id__in=amounts)
+    items.update(total_amount=Greatest(F('total_amount') + Case(
+        *(When(ingredient_id=ingredient_id, then=Value(sign * amount))
+          for ingredient_id, amount in amounts.items()),
+        output_field=IntegerField()
+    ), 0))
+    if sign < 0:
+        items.filter(total_amount=0).delete()
+
+
+def refresh_shopping_lists(user_ids=None, ingredient_ids=None):
+    """Пересчитывает списки покупок пользователей по их корзинам.
+
+    Без user_ids пересчитываются списки всех пользователей, без
+    ingredient_ids - все позиции списков.
+    """
+    items = ShoppingListItem.objects.all()
+    lookups = {'recipe__recipe_ingredients__isnull': False}
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        lookups['user_id__in'] = user_ids
+    if ingredient_ids is not None:
+        items = items.filter(ingredient_id__in=ingredient_ids)
+        lookups['recipe__recipe_ingredients__ingredient_id__in'] = (
+            ingredient_ids
+        )
+    # Условия на ингредиенты в одном filter(), чтобы values() и annotate()
+    # использовали тот же JOIN.
+    carts = ShoppingCart.objects.order_by().filter(**lookups)
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=row['user_id'],
+                         ingredient_id=row['ingredient_id'],
+                         total_amount=row['total_amount'])
+        for row in carts.values(
+            'user_id',
+            ingredient_id=F('recipe__recipe_ingredients__ingredient')
+        ).annotate(
+            total_amount=Sum('recipe__recipe_ingredients__amount')
+        ).iterator()
+    )
+
+
+def recount_shopping_lists(user_ids, ingredient_ids):
+    """Пересчитывает существующие позиции, не добавляя новых.
+
+    Используется при удалении ингредиента из рецепта: при каскадном
+    удалении пользователь может удаляться вместе со своим списком.
+    """
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids,
+                                            ingredient_id__in=ingredient_ids)
+    items.update(total_amount=Coalesce(Subquery(
+        RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user_id=OuterRef('user_id'),
+            ingredient_id=OuterRef('ingredient_id')
+        ).order_by().values('ingredient_id').annotate(
+            total=Sum('amount')
+        ).values('total')
+    ), 0))
+    items.filter(total_amount=0).delete()
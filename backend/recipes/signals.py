@@ -0,0 +1,130 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Follower, User
+
+from .counters import change_counter
+from .feed import backfill_feed, fan_out_recipe, trim_feed
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .search import index_recipe, unindex_recipe
+from .shopping_list import (change_shopping_list, recount_shopping_lists,
+                            refresh_shopping_lists)
+
+
+def touch_recipes(recipes):
+    """Обновляет дату изменения рецептов без сохранения модели."""
+    recipes.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, (instance.recipe_id,), 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    change_counter(Recipe, (instance.recipe_id,), 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_item_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, (instance.recipe_id,), 'in_carts_count', 1)
+        change_shopping_list(instance.user_id, (instance.recipe_id,), 1)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def cart_item_removing(sender, instance, **kwargs):
+    """Ингредиенты вычитаются до удаления.
+
+    При каскадном удалении рецепта они в этот момент еще существуют.
+    """
+    change_shopping_list(instance.user_id, (instance.recipe_id,), -1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_item_removed(sender, instance, **kwargs):
+    change_counter(Recipe, (instance.recipe_id,), 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    """Списки пересчитываются целиком: мог смениться сам ингредиент."""
+    touch_recipes(Recipe.objects.filter(pk=instance.recipe_id))
+    refresh_shopping_lists(ShoppingCart.objects.filter(
+        recipe_id=instance.recipe_id
+    ).values('user_id'))
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_removed(sender, instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(pk=instance.recipe_id))
+    recount_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe_id=instance.recipe_id
+        ).values('user_id'),
+        (instance.ingredient_id,)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, using, **kwargs):
+    if created:
+        change_counter(User, (instance.author_id,), 'recipes_count', 1)
+        fan_out_recipe(instance)
+    index_recipe(instance, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, using, **kwargs):
+    change_counter(User, (instance.author_id,), 'recipes_count', -1)
+    unindex_recipe(instance, using)
+
+
+@receiver(post_save, sender=Follower)
+def follower_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, (instance.author_id,), 'followers_count', 1)
+        backfill_feed(instance.user_id, (instance.author_id,))
+
+
+@receiver(post_delete, sender=Follower)
+def follower_removed(sender, instance, **kwargs):
+    change_counter(User, (instance.author_id,), 'followers_count', -1)
+    trim_feed(instance.user_id, (instance.author_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_recipes(Recipe.objects.filter(pk=instance.pk))
+    elif action == 'pre_clear':
+        touch_recipes(Recipe.objects.filter(tags=instance))
+    else:
+        touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields, **kwargs):
+    """Данные автора входят в представление рецепта."""
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    touch_recipes(instance.recipes.all())
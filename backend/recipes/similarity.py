@@ -0,0 +1,211 @@
+import json
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from random import Random
+
+from django.utils import timezone
+
+from .models import Recipe, RecipeIngredient
+from .utils import replace_file
+
+MAGIC = b'FGSIM001'
+HEADER = struct.Struct('<8sQ')
+NUM_HASHES = 64
+BAND_ROWS = 2
+PRIME = (1 << 61) - 1
+MASK = (1 << 64) - 1
+DEFAULT_SEED = 1
+# Запас времени построения индекса: рецепты, измененные в транзакциях,
+# которые еще не были зафиксированы при чтении, считаются измененными
+# после построения.
+BUILD_MARGIN = timedelta(minutes=5)
+# Файловый индекс устарел, когда измененных после построения рецептов
+# больше REBUILD_MIN и больше 1/REBUILD_DIVISOR индекса.
+REBUILD_MIN = 1000
+REBUILD_DIVISOR = 10
+# Разделы файла: имя, тип элементов array.
+SECTIONS = (
+    ('ids', 'q'),
+    ('offsets', 'Q'),
+    ('ingredients', 'q'),
+    ('bucket_keys', 'Q'),
+    ('bucket_recipes', 'Q'),
+)
+
+
+def jaccard(first, second):
+    """Коэффициент Жаккара двух множеств."""
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
+
+
+def recipe_ingredient_sets(recipe_ingredients=None):
+    """Пары (id рецепта, множество id ингредиентов) по возрастанию id."""
+    if recipe_ingredients is None:
+        recipe_ingredients = RecipeIngredient.objects.all()
+    rows = recipe_ingredients.order_by('recipe_id').values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator()
+    for recipe_id, group in groupby(rows, key=itemgetter(0)):
+        yield recipe_id, frozenset(map(itemgetter(1), group))
+
+
+class MinHasher:
+    """MinHash-сигнатуры наборов ингредиентов и ключи LSH-корзин.
+
+    Сигнатура из NUM_HASHES минимумов хеш-функций делится на полосы по
+    BAND_ROWS значений. Рецепты с совпадающей полосой попадают в одну
+    корзину: чем больше общих ингредиентов, тем больше совпадающих
+    полос. Хеши ингредиентов считаются один раз и запоминаются.
+    """
+
+    def __init__(self, seed=DEFAULT_SEED):
+        self.seed = seed
+        rng = Random(seed)
+        self._functions = [
+            (rng.randrange(1, PRIME), rng.randrange(PRIME))
+            for _ in range(NUM_HASHES)
+        ]
+        self._hashes = {}
+
+    def _ingredient_hashes(self, ingredient_id):
+        hashes = self._hashes.get(ingredient_id)
+        if hashes is None:
+            hashes = self._hashes[ingredient_id] = tuple(
+                (a * ingredient_id + b) % PRIME for a, b in self._functions
+            )
+        return hashes
+
+    def band_keys(self, ingredient_ids):
+        """Ключи корзин набора ингредиентов, по одному на полосу."""
+        if not ingredient_ids:
+            return []
+        signature = list(map(min, zip(*map(
+            self._ingredient_hashes, ingredient_ids
+        ))))
+        keys = []
+        for band, start in enumerate(range(0, NUM_HASHES, BAND_ROWS)):
+            key = band
+            for value in signature[start:start + BAND_ROWS]:
+                key = ((key * 0x100000001b3) ^ value) & MASK
+            keys.append(key)
+        return keys
+
+
+def write_index(stream, ingredient_sets, built_at, seed=DEFAULT_SEED):
+    """Записывает индекс похожести рецептов в бинарный поток.
+
+    Формат: заголовок с длиной метаданных в JSON, затем разделы SECTIONS,
+    выровненные по 8 байт. Разделы читаются через memoryview без
+    разбора, поэтому файл можно отображать в память (mmap).
+    """
+    hasher = MinHasher(seed)
+    ids = array('q')
+    offsets = array('Q', (0,))
+    ingredients = array('q')
+    buckets = []
+    for index, (recipe_id, ingredient_ids) in enumerate(ingredient_sets):
+        ids.append(recipe_id)
+        ingredients.extend(sorted(ingredient_ids))
+        offsets.append(len(ingredients))
+        buckets.extend(
+            (key, index) for key in hasher.band_keys(ingredient_ids)
+        )
+    buckets.sort()
+    sections = {
+        'ids': ids,
+        'offsets': offsets,
+        'ingredients': ingredients,
+        'bucket_keys': array('Q', map(itemgetter(0), buckets)),
+        'bucket_recipes': array('Q', map(itemgetter(1), buckets)),
+    }
+    meta = json.dumps({
+        'built_at': built_at.isoformat(),
+        'seed': seed,
+        'num_hashes': NUM_HASHES,
+        'band_rows': BAND_ROWS,
+        'sections': [len(sections[name]) for name, _ in SECTIONS],
+    }).encode()
+    meta += b' ' * (-(HEADER.size + len(meta)) % 8)
+    stream.write(HEADER.pack(MAGIC, len(meta)))
+    stream.write(meta)
+    for name, _ in SECTIONS:
+        stream.write(sections[name].tobytes())
+    return len(ids)
+
+
+def build_index(stream, seed=DEFAULT_SEED):
+    """Строит индекс по всем рецептам, возвращает число рецептов."""
+    built_at = timezone.now() - BUILD_MARGIN
+    return write_index(stream, recipe_ingredient_sets(), built_at, seed)
+
+
+def build_index_file(path, seed=DEFAULT_SEED):
+    """Строит индекс в файл path с атомарной заменой.
+
+    Возвращает число рецептов в индексе.
+    """
+    return replace_file(path, lambda stream: build_index(stream, seed))
+
+
+def is_stale(index):
+    """Нужно ли перестроить индекс из-за измененных рецептов.
+
+    index - индекс с атрибутом built_at и длиной в рецептах. Рецепты
+    моложе BUILD_MARGIN не учитываются: после перестроения они все равно
+    остались бы измененными.
+    """
+    return Recipe.objects.filter(
+        updated_at__gt=index.built_at,
+        updated_at__lte=timezone.now() - BUILD_MARGIN
+    ).count() > max(REBUILD_MIN, len(index) // REBUILD_DIVISOR)
+
+
+class SimilarityIndex:
+    """Индекс похожести рецептов поверх буфера из write_index().
+
+    Буфер может быть отображенным в память файлом: данные не копируются,
+    поиск корзины выполняется двоичным поиском по отсортированным ключам.
+    """
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        magic, meta_size = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError('Неизвестный формат индекса похожести.')
+        meta = json.loads(bytes(view[HEADER.size:HEADER.size + meta_size]))
+        if (meta['num_hashes'], meta['band_rows']) != (NUM_HASHES,
+                                                       BAND_ROWS):
+            raise ValueError('Индекс построен с другими параметрами.')
+        self.built_at = datetime.fromisoformat(meta['built_at'])
+        self.hasher = MinHasher(meta['seed'])
+        position = HEADER.size + meta_size
+        for (name, typecode), size in zip(SECTIONS, meta['sections']):
+            end = position + size * 8
+            setattr(self, name, view[position:end].cast(typecode))
+            position = end
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_ingredients(self, recipe_id):
+        """Множество ингредиентов рецепта или None, если его нет в индексе."""
+        index = bisect_left(self.ids, recipe_id)
+        if index == len(self.ids) or self.ids[index] != recipe_id:
+            return None
+        return self.get_ingredients_at(index)
+
+    def get_ingredients_at(self, index):
+        return frozenset(
+            self.ingredients[self.offsets[index]:self.offsets[index + 1]]
+        )
+
+    def get_bucket(self, key):
+        """Позиции рецептов в корзине с ключом key."""
+        start = bisect_left(self.bucket_keys, key)
+        end = bisect_right(self.bucket_keys, key, start)
+        return self.bucket_recipes[start:end]
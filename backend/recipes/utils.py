@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+from django.db import connections
+
+
+def delete_rows(queryset):
+    """Удаляет строки запроса одним DELETE, без сигналов и каскадов.
+
+    Возвращает число удаленных строк. Зависящие от строк данные
+    (счетчики, списки покупок) вызывающий код обновляет сам.
+    """
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    meta = queryset.model._meta
+    subquery, params = queryset.order_by().values('pk').query.get_compiler(
+        connection=connection
+    ).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(meta.db_table)} '
+            f'WHERE {quote(meta.pk.column)} IN ({subquery})',
+            params
+        )
+        return cursor.rowcount
+
+
+def replace_file(path, write):
+    """Записывает файл во временный рядом с path и атомарно заменяет им path.
+
+    write(stream) пишет содержимое в двоичный поток, его результат
+    возвращается. При ошибке временный файл удаляется.
+    """
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp'
+    )
+    try:
+        with os.fdopen(descriptor, 'wb') as stream:
+            result = write(stream)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return result
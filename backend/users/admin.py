@@ -5,7 +5,8 @@ from .models import Follower, User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name')
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
     search_fields = ('id', 'username', 'email', 'first_name', 'last_name')
     list_filter = ('username', 'email')
     ordering = ('username',)
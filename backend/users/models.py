@@ -5,7 +5,24 @@ MAX_LENGTH_BASE = 150
 MAX_LENGTH_EMAIL = 254
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Не перезаписывает счетчики при сохранении существующего объекта.
+
+    Счетчики изменяются только запросами UPDATE с F()-выражениями.
+    """
+
+    counters = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counters
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     email = models.EmailField(max_length=MAX_LENGTH_EMAIL, unique=True,
                               verbose_name='Адрес электронной почты')
     username = models.CharField(max_length=MAX_LENGTH_BASE, unique=True,
@@ -14,6 +31,14 @@ class User(AbstractUser):
                                   verbose_name='Имя')
     last_name = models.CharField(max_length=MAX_LENGTH_BASE,
                                  verbose_name='Фамилия')
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество подписчиков'
+    )
+
+    counters = ('recipes_count', 'followers_count')
 
     class Meta:
         verbose_name = 'Пользователь'